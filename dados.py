@@ -0,0 +1,934 @@
+"""Camada de dados do Dashboard de Consultas Médicas.
+
+Fica separada de dashboard.py para poder ser usada também por processos sem
+Streamlit, como o publicador de snapshots (publicar_dados.py).
+"""
+import hashlib
+import json
+import mmap
+import os
+import shutil
+import time
+import warnings
+from io import StringIO
+
+import numpy as np
+import pandas as pd
+import requests
+
+URL_DADOS = "https://cdn.jsdelivr.net/gh/rafael-albuquerque07/consultas-medicas@main/consultas.csv"
+
+# Nome do arquivo que aponta para a versão publicada dentro da pasta de snapshots
+ARQUIVO_ATUAL = "ATUAL"
+
+# Incrementar sempre que o conteúdo do snapshot mudar, para forçar a republicação
+FORMATO_SNAPSHOT = 2
+
+# Esquema e vocabulários esperados no CSV (vocabulários configuráveis por variável de ambiente)
+COLUNAS_OBRIGATORIAS = ['dataconsulta', 'unidade', 'tipoconsulta', 'valor', 'retornodaconsulta']
+
+# Normalizados como as colunas (strip + lower), para "Centro, Bairro" funcionar
+UNIDADES_CONHECIDAS = [
+    v.strip().lower()
+    for v in os.environ.get("CONSULTAS_UNIDADES", "bairro,centro,interior").split(',')
+    if v.strip()
+]
+ESPECIALIDADES_CONHECIDAS = [
+    v.strip().lower()
+    for v in os.environ.get("CONSULTAS_ESPECIALIDADES", "cardio,endocrino,pediatra,urologista").split(',')
+    if v.strip()
+]
+VALOR_MAXIMO = float(os.environ.get("CONSULTAS_VALOR_MAXIMO", "100000"))
+RETORNO_MAXIMO = float(os.environ.get("CONSULTAS_RETORNO_MAXIMO", "365"))
+
+# Arrays do cubo gravados como .npy e mapeados em memória pelos workers
+_ARRAYS_CUBO = ['qtd', 'valor', 'retorno_soma', 'retorno_qtd']
+
+# Colunas com esboço de quantis no cubo e erro relativo máximo dos quantis
+COLUNAS_ESBOCO = ['valor', 'retornodaconsulta']
+ERRO_RELATIVO_ESBOCO = 0.01
+
+
+# ============== LEITURA ==============
+def baixar_csv(url=URL_DADOS):
+    """Baixa o CSV bruto do jsDelivr"""
+    response = requests.get(url, timeout=30)
+    response.raise_for_status()
+    return response.text
+
+
+def versao_do_conteudo(texto):
+    """Identificador curto e estável do conteúdo do CSV"""
+    return hashlib.sha1(texto.encode('utf-8')).hexdigest()[:12]
+
+
+def versao_do_snapshot(versao_conteudo):
+    """Versão do snapshot: versão do conteúdo + formato dos arquivos gravados"""
+    return f"{versao_conteudo}-f{FORMATO_SNAPSHOT}"
+
+
+def ler_consultas(texto):
+    """Converte o texto do CSV em (df válido, quarentena)"""
+    return validar_consultas(pd.read_csv(StringIO(texto), dtype=str))
+
+
+# ============== ARQUIVO LOCAL ==============
+def assinatura_arquivo(caminho):
+    """(inode, tamanho, mtime) do arquivo: muda sempre que ele é reescrito ou trocado"""
+    info = os.stat(caminho)
+    return info.st_ino, info.st_size, info.st_mtime_ns
+
+
+def versao_do_arquivo(caminho):
+    """Hash do conteúdo do arquivo lido por mapeamento em memória.
+
+    Mesmo formato de versao_do_conteudo, então o mesmo CSV tem a mesma
+    versão vindo do disco ou do jsDelivr. Serve para não reprocessar um
+    arquivo apenas tocado (mtime novo, conteúdo igual).
+    """
+    with open(caminho, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return hashlib.sha1(b'').hexdigest()[:12]
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapa:
+            return hashlib.sha1(mapa).hexdigest()[:12]
+
+
+def ler_arquivo_consultas(caminho):
+    """Lê CSV, Parquet ou Arrow/Feather local com mapeamento em memória.
+
+    Retorna (df válido, quarentena), como ler_consultas. Parquet e Arrow
+    precisam do pyarrow instalado.
+    """
+    extensao = os.path.splitext(caminho)[1].lower()
+    if extensao == '.csv':
+        return validar_consultas(pd.read_csv(caminho, dtype=str, memory_map=True))
+
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError(f"Leitura de arquivos {extensao} requer o pacote pyarrow") from None
+
+    if extensao == '.parquet':
+        tabela = pq.read_table(caminho, memory_map=True)
+    elif extensao in ('.arrow', '.feather', '.ipc'):
+        with pa.memory_map(caminho) as fonte:
+            tabela = pa.ipc.open_file(fonte).read_all()
+    else:
+        raise ValueError(f"Formato de arquivo não suportado: {extensao or caminho}")
+    # Sem linha de cabeçalho: 'linha' é o número do registro (base 1)
+    return validar_consultas(tabela.to_pandas(), primeira_linha=1)
+
+
+# ============== VALIDAÇÃO ==============
+def validar_consultas(bruto, primeira_linha=2):
+    """Separa as linhas válidas das que vão para a quarentena.
+
+    Todas as regras são máscaras vetorizadas sobre as colunas. Retorna
+    (df, quarentena): df com os tipos já convertidos e quarentena com as
+    linhas originais, o número da linha no arquivo e os códigos de motivo
+    separados por ';'. `primeira_linha` é o número do primeiro registro
+    (2 num CSV, por causa do cabeçalho; 1 em Parquet/Arrow). Só a falta de
+    colunas obrigatórias invalida o arquivo inteiro (ValueError).
+    """
+    faltando = [c for c in COLUNAS_OBRIGATORIAS if c not in bruto.columns]
+    if faltando:
+        raise ValueError(f"Colunas obrigatórias ausentes no CSV: {', '.join(faltando)}")
+
+    bruto = bruto[COLUNAS_OBRIGATORIAS]
+    # Formato fixo: sem ele o pandas infere o formato pela primeira linha e uma
+    # data fora do padrão no topo invalidaria todas as demais
+    datas = pd.to_datetime(bruto['dataconsulta'], format='ISO8601', errors='coerce')
+    unidade = bruto['unidade'].str.strip().str.lower()
+    tipo = bruto['tipoconsulta'].str.strip().str.lower()
+    valor = pd.to_numeric(bruto['valor'], errors='coerce')
+    retorno = pd.to_numeric(bruto['retornodaconsulta'], errors='coerce')
+
+    # Retorno vazio é permitido (entra como NaN); texto não numérico não
+    regras = {
+        'DATA_INVALIDA': datas.isna(),
+        'UNIDADE_DESCONHECIDA': ~unidade.isin(UNIDADES_CONHECIDAS),
+        'ESPECIALIDADE_DESCONHECIDA': ~tipo.isin(ESPECIALIDADES_CONHECIDAS),
+        'VALOR_INVALIDO': valor.isna(),
+        'VALOR_NEGATIVO': valor < 0,
+        'VALOR_FORA_DA_FAIXA': valor > VALOR_MAXIMO,
+        'RETORNO_INVALIDO': retorno.isna() & bruto['retornodaconsulta'].notna(),
+        'RETORNO_FORA_DA_FAIXA': (retorno < 0) | (retorno > RETORNO_MAXIMO),
+    }
+    rejeitada = np.zeros(len(bruto), dtype=bool)
+    for mascara in regras.values():
+        rejeitada |= mascara.to_numpy()
+
+    df = pd.DataFrame({
+        'dataconsulta': datas,
+        'unidade': unidade,
+        'tipoconsulta': tipo,
+        'valor': valor,
+        'retornodaconsulta': retorno,
+    })[~rejeitada].reset_index(drop=True)
+
+    quarentena = bruto[rejeitada].copy()
+    motivos = pd.Series('', index=quarentena.index)
+    for codigo, mascara in regras.items():
+        motivos += np.where(mascara[rejeitada], codigo + ';', '')
+    # Posição no arquivo, não o índice (Parquet pode trazer o índice salvo pelo pandas)
+    quarentena.insert(0, 'linha', np.flatnonzero(rejeitada) + primeira_linha)
+    quarentena['motivo'] = motivos.str.rstrip(';')
+    return df, quarentena.reset_index(drop=True)
+
+
+def contar_motivos(quarentena):
+    """Quantidade de linhas em quarentena por código de motivo"""
+    return (
+        quarentena['motivo'].str.split(';').explode().value_counts()
+        .rename_axis('Motivo').reset_index(name='Linhas')
+    )
+
+
+# ============== PRÉ-AGREGADOS ==============
+def construir_cubo(df):
+    """Agrega o dataset em arrays densos dia × unidade × especialidade.
+
+    O cubo guarda quantidade, faturamento e soma/quantidade de retornos por
+    célula, o suficiente para refazer os indicadores de qualquer período e
+    conjunto de unidades sem voltar às linhas brutas, além dos esboços de
+    quantis de valor e retorno (ver construir_esboco).
+    """
+    unidades = sorted(df['unidade'].unique())
+    tipos = sorted(df['tipoconsulta'].unique())
+    n_u, n_t = len(unidades), len(tipos)
+
+    if len(df) == 0:
+        dia0 = pd.Timestamp('1970-01-01')
+        n_d = 0
+        chave = np.zeros(0, dtype=np.int64)
+    else:
+        datas = df['dataconsulta'].dt.normalize()
+        dia0 = datas.min()
+        dias = (datas - dia0).dt.days.to_numpy(dtype=np.int64)
+        n_d = int(dias.max()) + 1
+        cod_u = pd.Categorical(df['unidade'], categories=unidades).codes.astype(np.int64)
+        cod_t = pd.Categorical(df['tipoconsulta'], categories=tipos).codes.astype(np.int64)
+        chave = (dias * n_u + cod_u) * n_t + cod_t
+
+    tamanho = n_d * n_u * n_t
+    forma = (n_d, n_u, n_t)
+    valor = df['valor'].to_numpy(dtype=np.float64)
+    retorno = df['retornodaconsulta'].to_numpy(dtype=np.float64)
+    com_retorno = ~np.isnan(retorno)
+
+    return {
+        'dia0': dia0,
+        'unidades': unidades,
+        'tipos': tipos,
+        'qtd': np.bincount(chave, minlength=tamanho).reshape(forma),
+        'valor': np.bincount(chave, weights=valor, minlength=tamanho).reshape(forma),
+        'retorno_soma': np.bincount(chave[com_retorno], weights=retorno[com_retorno], minlength=tamanho).reshape(forma),
+        'retorno_qtd': np.bincount(chave[com_retorno], minlength=tamanho).reshape(forma),
+        'esbocos': {
+            coluna: construir_esboco(df[coluna].to_numpy(dtype=np.float64), chave, forma)
+            for coluna in COLUNAS_ESBOCO
+        },
+    }
+
+
+def construir_esboco(x, chave, forma, alfa=ERRO_RELATIVO_ESBOCO):
+    """Histograma logarítmico mesclável por célula do cubo (no estilo DDSketch).
+
+    Cada valor positivo cai no balde ceil(log_gamma(x)), com
+    gamma = (1 + alfa) / (1 - alfa), e zeros ficam num balde próprio. Mesclar
+    esboços de vários dias, unidades ou especialidades é só somar as
+    contagens, e qualquer quantil sai com erro relativo de no máximo `alfa`.
+    Só a faixa de baldes observada nos dados é guardada.
+    """
+    gamma = (1 + alfa) / (1 - alfa)
+    validos = ~np.isnan(x) & (x >= 0)
+    x, chave = x[validos], chave[validos]
+    positivos = x > 0
+
+    expoente = np.zeros(len(x), dtype=np.int64)
+    expoente[positivos] = np.ceil(np.log(x[positivos]) / np.log(gamma))
+    indice_min = int(expoente[positivos].min()) if positivos.any() else 0
+    indice_max = int(expoente[positivos].max()) if positivos.any() else -1
+    n_baldes = indice_max - indice_min + 2
+
+    # Balde 0 = zeros; baldes 1.. = expoentes indice_min..indice_max
+    balde = np.where(positivos, expoente - indice_min + 1, 0)
+    tamanho = int(np.prod(forma)) * n_baldes
+    contagens = np.bincount(chave * n_baldes + balde, minlength=tamanho)
+    return {
+        'gamma': gamma,
+        'indice_min': indice_min,
+        'contagens': contagens.astype(np.int32).reshape(*forma, n_baldes),
+    }
+
+
+def representantes_esboco(esboco):
+    """Valor representativo de cada balde (ponto de erro relativo mínimo)"""
+    gamma = esboco['gamma']
+    n_baldes = esboco['contagens'].shape[-1]
+    expoentes = esboco['indice_min'] + np.arange(n_baldes - 1)
+    return np.concatenate([[0.0], 2 * gamma ** expoentes / (gamma + 1)])
+
+
+def quantis_esboco(esboco, inicio, fim, cubo, unidades=None, por='unidade', quantis=(0.1, 0.25, 0.5, 0.75, 0.9)):
+    """Quantis por unidade ou especialidade mesclando os esboços do período.
+
+    Retorna um DataFrame com o grupo, a quantidade de observações e uma
+    coluna por quantil (q10, q25, q50...). Grupos sem observações são omitidos.
+    """
+    idx_u = indices_unidades(cubo, unidades)
+    fatia = esboco['contagens'][fatia_dias(cubo, inicio, fim)][:, idx_u]
+    if por == 'unidade':
+        grupos = [cubo['unidades'][i] for i in idx_u]
+        hist = fatia.sum(axis=(0, 2), dtype=np.int64)
+    else:
+        grupos = list(cubo['tipos'])
+        hist = fatia.sum(axis=(0, 1), dtype=np.int64)
+
+    resultado = pd.DataFrame({por: grupos, 'n': hist.sum(axis=1)})
+    resultado = pd.concat([resultado, _quantis_histograma(hist, esboco, quantis)], axis=1)
+    return resultado[resultado['n'] > 0].reset_index(drop=True)
+
+
+def quantis_esboco_celulas(esboco, inicio, fim, cubo, unidades=None, quantis=(0.5, 0.9)):
+    """Quantis para cada combinação unidade × especialidade do período"""
+    idx_u = indices_unidades(cubo, unidades)
+    hist = esboco['contagens'][fatia_dias(cubo, inicio, fim)][:, idx_u].sum(axis=0, dtype=np.int64)
+    n_u, n_t, n_baldes = hist.shape
+    resultado = pd.DataFrame({
+        'unidade': np.repeat([cubo['unidades'][i] for i in idx_u], n_t),
+        'tipoconsulta': np.tile(cubo['tipos'], n_u),
+        'n': hist.sum(axis=2).ravel(),
+    })
+    resultado = pd.concat([resultado, _quantis_histograma(hist.reshape(-1, n_baldes), esboco, quantis)], axis=1)
+    return resultado[resultado['n'] > 0].reset_index(drop=True)
+
+
+def _quantis_histograma(hist, esboco, quantis):
+    """Quantis de vários histogramas de uma vez (linhas = grupos)"""
+    representantes = representantes_esboco(esboco)
+    acumulado = np.cumsum(hist, axis=1)
+    total = acumulado[:, -1:]
+    colunas = {}
+    for q in quantis:
+        # Posição (0-based) do elemento de ordem q, como no quantil 'lower'
+        posicao = np.floor(q * np.maximum(total - 1, 0))
+        balde = (acumulado > posicao).argmax(axis=1)
+        colunas[f'q{round(q * 100)}'] = np.where(total[:, 0] > 0, representantes[balde], np.nan)
+    return pd.DataFrame(colunas)
+
+
+def indices_unidades(cubo, unidades):
+    """Índices das unidades selecionadas no eixo do cubo (vazio = todas)"""
+    if not unidades:
+        return np.arange(len(cubo['unidades']))
+    return np.flatnonzero(np.isin(cubo['unidades'], list(unidades)))
+
+
+def fatia_dias(cubo, inicio, fim):
+    """Converte um intervalo de datas (inclusivo) em slice do eixo de dias"""
+    n_d = cubo['qtd'].shape[0]
+    i0 = (pd.Timestamp(inicio) - cubo['dia0']).days
+    i1 = (pd.Timestamp(fim) - cubo['dia0']).days + 1
+    return slice(min(max(i0, 0), n_d), min(max(i1, 0), n_d))
+
+
+def serie_diaria(cubo, inicio, fim, unidades=None):
+    """Consultas e faturamento por dia a partir do cubo.
+
+    Assim como o groupby por data, só retorna dias que tiveram consultas.
+    """
+    dias = fatia_dias(cubo, inicio, fim)
+    idx_u = indices_unidades(cubo, unidades)
+    qtd = cubo['qtd'][dias][:, idx_u, :].sum(axis=(1, 2))
+    valor = cubo['valor'][dias][:, idx_u, :].sum(axis=(1, 2))
+    datas = cubo['dia0'] + pd.to_timedelta(np.arange(dias.start, dias.stop), unit='D')
+    com_dados = qtd > 0
+    return pd.DataFrame({
+        'Data': datas[com_dados],
+        'Total': qtd[com_dados],
+        'Faturamento': valor[com_dados],
+    })
+
+
+DIAS_SEMANA = ['Segunda', 'Terça', 'Quarta', 'Quinta', 'Sexta', 'Sábado', 'Domingo']
+
+
+def matriz_unidade_especialidade(cubo, inicio, fim, unidades=None, medida='qtd'):
+    """Matriz unidade × especialidade somando as fatias diárias do cubo"""
+    dias = fatia_dias(cubo, inicio, fim)
+    idx_u = indices_unidades(cubo, unidades)
+    matriz = cubo[medida][dias][:, idx_u, :].sum(axis=0)
+    return pd.DataFrame(
+        matriz,
+        index=pd.Index([cubo['unidades'][i] for i in idx_u], name='unidade'),
+        columns=pd.Index(cubo['tipos'], name='tipoconsulta'),
+    )
+
+
+def matriz_dia_semana_unidade(cubo, inicio, fim, unidades=None, medida='qtd'):
+    """Matriz dia da semana × unidade somando as fatias diárias do cubo.
+
+    Cada dia do período cai numa linha pelo seu dia da semana (segunda = 0),
+    derivado de dia0 e da posição no eixo, sem tocar nas linhas brutas.
+    """
+    dias = fatia_dias(cubo, inicio, fim)
+    idx_u = indices_unidades(cubo, unidades)
+    por_dia = cubo[medida][dias][:, idx_u, :].sum(axis=2)
+    dia_semana = (cubo['dia0'].dayofweek + np.arange(dias.start, dias.stop)) % 7
+    matriz = np.zeros((7, len(idx_u)))
+    np.add.at(matriz, dia_semana, por_dia)
+    return pd.DataFrame(
+        matriz,
+        index=pd.Index(DIAS_SEMANA, name='dia_semana'),
+        columns=pd.Index([cubo['unidades'][i] for i in idx_u], name='unidade'),
+    )
+
+
+# ============== PREVISÃO ==============
+HORIZONTE_PREVISAO = 14
+JANELA_PREVISAO = 180
+
+
+def prever_cubo(cubo, horizonte=HORIZONTE_PREVISAO, janela=JANELA_PREVISAO):
+    """Previsão diária de quantidade e faturamento para todas as séries do cubo.
+
+    Cada série unidade × especialidade recebe o mesmo modelo, tendência
+    linear mais sazonalidade por dia da semana, ajustado nos últimos
+    `janela` dias. Como o desenho é igual para todas, o ajuste é um único
+    mínimos quadrados sobre a matriz dias × séries. Com menos de duas
+    semanas de histórico a sazonalidade é deixada de fora.
+
+    Retorna None se não houver dias suficientes; senão, um dict com as
+    datas previstas e, por medida, a média (horizonte × U × T) e o desvio
+    dos resíduos (U × T).
+    """
+    n_total = cubo['qtd'].shape[0]
+    inicio = max(n_total - janela, 0)
+    n_d = n_total - inicio
+    if n_d < 3:
+        return None
+
+    t = np.arange(inicio, n_total + horizonte)
+    dia_semana = (cubo['dia0'].dayofweek + t) % 7
+    colunas = [np.ones(len(t)), (t - inicio) / max(n_d - 1, 1)]
+    if n_d >= 14:
+        colunas += [(dia_semana == d).astype(np.float64) for d in range(1, 7)]
+    X = np.column_stack(colunas)
+    X_hist, X_fut = X[:n_d], X[n_d:]
+    graus_liberdade = max(n_d - X.shape[1], 1)
+
+    forma = cubo['qtd'].shape[1:]
+    previsao = {
+        'datas': cubo['dia0'] + pd.to_timedelta(np.arange(n_total, n_total + horizonte), unit='D'),
+    }
+    for medida in ('qtd', 'valor'):
+        Y = np.asarray(cubo[medida][inicio:], dtype=np.float64).reshape(n_d, -1)
+        beta, *_ = np.linalg.lstsq(X_hist, Y, rcond=None)
+        residuos = Y - X_hist @ beta
+        previsao[medida] = (X_fut @ beta).reshape(horizonte, *forma)
+        previsao[f'{medida}_sigma'] = np.sqrt((residuos ** 2).sum(axis=0) / graus_liberdade).reshape(forma)
+    return previsao
+
+
+def previsao_agregada(previsao, cubo, medida, unidades=None, z=1.96):
+    """Soma a previsão das séries das unidades selecionadas, com banda de confiança.
+
+    O modelo é linear, então a soma das previsões é a previsão da soma; a
+    banda assume resíduos independentes entre séries.
+    """
+    idx_u = indices_unidades(cubo, unidades)
+    media = previsao[medida][:, idx_u, :].sum(axis=(1, 2))
+    sigma = np.sqrt((previsao[f'{medida}_sigma'][idx_u, :] ** 2).sum())
+    return pd.DataFrame({
+        'Data': previsao['datas'],
+        'Previsão': np.maximum(media, 0.0),
+        'Inferior': np.maximum(media - z * sigma, 0.0),
+        'Superior': np.maximum(media + z * sigma, 0.0),
+    })
+
+
+# ============== ANOMALIAS ==============
+SEMANAS_ANOMALIA = 8
+MINIMO_SEMANAS_ANOMALIA = 4
+LIMIAR_ANOMALIA = 3.5
+
+
+def _janelas_semanais(Y, inicio, semanas):
+    """Visão (dias inicio.. × séries × semanas) com o mesmo dia da semana nas semanas anteriores.
+
+    janelas[i, s, k] = Y[inicio + i - 7·semanas + 7k, s]; dias antes do
+    início do cubo entram como NaN. Sai de uma única sliding_window_view
+    com passo 7, sem laço por série.
+    """
+    janela = 7 * semanas
+    n_d, n_series = Y.shape
+    if inicio >= n_d:
+        # Nenhum dia a recalcular (cubo igual ou só truncado)
+        return np.empty((0, n_series, semanas))
+    preenchido = np.concatenate([np.full((janela, n_series), np.nan), Y])
+    trecho = preenchido[inicio:n_d + janela - 1]
+    return np.lib.stride_tricks.sliding_window_view(trecho, janela, axis=0)[:, :, ::7]
+
+
+def _zscores_robustos(y, janelas, minimo=MINIMO_SEMANAS_ANOMALIA):
+    """z-score robusto de contagens y (dias × séries) contra as janelas semanais.
+
+    Compara na escala de Anscombe, 2·√(y + 3/8), onde contagens Poisson têm
+    variância ≈ 1 seja qual for a média: z = 0,6745 · (a − mediana) / MAD,
+    com o MAD corrigido para amostras pequenas (fator n / (n − 0,8)) e
+    nunca abaixo do MAD de uma Poisson (0,6745). Dias com menos de
+    `minimo` semanas de histórico ficam com z = NaN.
+    """
+    a = 2 * np.sqrt(np.maximum(y, 0) + 0.375)
+    A = 2 * np.sqrt(np.maximum(janelas, 0) + 0.375)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        mediana = np.nanmedian(A, axis=2)
+        mad = np.nanmedian(np.abs(A - mediana[:, :, None]), axis=2)
+    n = (~np.isnan(janelas)).sum(axis=2)
+    mad = np.maximum(mad * n / np.maximum(n - 0.8, 1.0), 0.6745)
+    z = 0.6745 * (a - mediana) / mad
+    return np.where(n >= minimo, z, np.nan)
+
+
+def atualizar_anomalias(cubo, estado=None, semanas=SEMANAS_ANOMALIA):
+    """z-scores de quantidade e faturamento de todas as séries do cubo.
+
+    Reaproveita o `estado` anterior: só os dias a partir do primeiro dia que
+    mudou (normalmente apenas os dias novos) são recalculados. Se o eixo de
+    dias ou as unidades/especialidades mudaram, recalcula tudo.
+    """
+    n_d = cubo['qtd'].shape[0]
+    medidas = {m: np.asarray(cubo[m], dtype=np.float64).reshape(n_d, -1) for m in ('qtd', 'valor')}
+
+    inicio = 0
+    compativel = (
+        estado is not None
+        and estado['dia0'] == cubo['dia0']
+        and estado['unidades'] == list(cubo['unidades'])
+        and estado['tipos'] == list(cubo['tipos'])
+        and estado['semanas'] == semanas
+    )
+    if compativel:
+        n_comum = min(estado['n_d'], n_d)
+        mudou = np.zeros(n_comum, dtype=bool)
+        for m, Y in medidas.items():
+            mudou |= (estado[m][:n_comum] != Y[:n_comum]).any(axis=1)
+        inicio = int(np.argmax(mudou)) if mudou.any() else n_comum
+
+    novo = {
+        'dia0': cubo['dia0'],
+        'unidades': list(cubo['unidades']),
+        'tipos': list(cubo['tipos']),
+        'semanas': semanas,
+        'n_d': n_d,
+        'recalculados': n_d - inicio,
+    }
+    janelas = {m: _janelas_semanais(Y, inicio, semanas) for m, Y in medidas.items()}
+    atuais = {m: Y[inicio:] for m, Y in medidas.items()}
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        # Faturamento vira "consultas equivalentes" pelo ticket médio da janela
+        # (ou do próprio dia, se a janela não teve consultas) para usar a mesma escala
+        soma_qtd = np.nansum(janelas['qtd'], axis=2)
+        ticket = np.where(
+            soma_qtd > 0, np.nansum(janelas['valor'], axis=2) / np.maximum(soma_qtd, 1),
+            np.where(atuais['qtd'] > 0, atuais['valor'] / np.maximum(atuais['qtd'], 1), 1.0))
+        ticket = np.maximum(ticket, 1.0)
+        esperados = {m: np.nanmedian(J, axis=2) for m, J in janelas.items()}
+    contagens = {
+        'qtd': (atuais['qtd'], janelas['qtd']),
+        'valor': (atuais['valor'] / ticket, janelas['valor'] / ticket[:, :, None]),
+    }
+    for m, Y in medidas.items():
+        z = _zscores_robustos(*contagens[m])
+        esperado = esperados[m]
+        novo[m] = Y
+        novo[f'z_{m}'] = np.concatenate([estado[f'z_{m}'][:inicio], z]) if inicio else z
+        novo[f'esperado_{m}'] = np.concatenate([estado[f'esperado_{m}'][:inicio], esperado]) if inicio else esperado
+    return novo
+
+
+def listar_anomalias(estado, inicio, fim, unidades=None, limiar=LIMIAR_ANOMALIA):
+    """Dias × séries com |z| acima do limiar no período, do mais recente ao mais antigo"""
+    n_t = len(estado['tipos'])
+    dias = fatia_dias({'qtd': estado['qtd'], 'dia0': estado['dia0']}, inicio, fim)
+    selecionadas = np.zeros(estado['qtd'].shape[1], dtype=bool)
+    for i in indices_unidades({'unidades': estado['unidades']}, unidades):
+        selecionadas[i * n_t:(i + 1) * n_t] = True
+
+    partes = []
+    for medida, rotulo in (('qtd', 'Consultas'), ('valor', 'Faturamento')):
+        z = estado[f'z_{medida}'][dias]
+        dia, serie = np.nonzero((np.abs(np.nan_to_num(z)) > limiar) & selecionadas)
+        partes.append(pd.DataFrame({
+            'Data': estado['dia0'] + pd.to_timedelta(dia + dias.start, unit='D'),
+            'Unidade': np.asarray(estado['unidades'])[serie // n_t],
+            'Especialidade': np.asarray(estado['tipos'])[serie % n_t],
+            'Medida': rotulo,
+            'Observado': estado[medida][dias][dia, serie],
+            'Esperado': estado[f'esperado_{medida}'][dias][dia, serie],
+            'z': z[dia, serie],
+        }))
+    return pd.concat(partes, ignore_index=True).sort_values(['Data', 'z'], ascending=[False, True])
+
+
+# ============== ATUALIZAÇÃO INCREMENTAL ==============
+def verificar_anexado(df, estado):
+    """Compara `df` com o dataset que gerou `estado` numa única passada.
+
+    Retorna (anexado, assinatura): anexado é True se `df` é aquele dataset
+    com linhas novas no fim; assinatura é o hash de `df` inteiro, a ser
+    guardado no novo estado.
+    """
+    hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    n = estado['n'] if estado is not None else 0
+    h = hashlib.sha1(hashes[:n].tobytes())
+    anexado = estado is not None and len(df) >= n and h.hexdigest() == estado['assinatura']
+    h.update(hashes[n:].tobytes())
+    return anexado, h.hexdigest()
+
+
+# ============== AMOSTRA ESTRATIFICADA ==============
+FRACAO_AMOSTRA = 0.02
+MINIMO_ESTRATO = 200
+
+
+def atualizar_amostra(df, estado=None, fracao=FRACAO_AMOSTRA, minimo_estrato=MINIMO_ESTRATO, semente=0):
+    """Amostra estratificada por unidade × especialidade, mantida incrementalmente.
+
+    Cada linha sorteada guarda um número uniforme `u` e fica na amostra
+    enquanto u < max(fracao, minimo_estrato / N_h), onde N_h é o tamanho do
+    estrato. Quando linhas são anexadas, só elas são sorteadas; os limiares
+    caem com o crescimento dos estratos e a amostra anterior é apenas
+    filtrada de novo, com a mesma distribuição de um sorteio do zero.
+    Se o dataset mudou de outra forma, a amostra é refeita.
+    """
+    anexado, assinatura = verificar_anexado(df, estado)
+    if not anexado:
+        estado = {
+            'n': 0,
+            'estratos': [],
+            'N': np.zeros(0, dtype=np.int64),
+            'linhas': df.iloc[:0].assign(estrato=np.zeros(0, dtype=np.int64), u=np.zeros(0)),
+        }
+
+    novas = df.iloc[estado['n']:]
+    rotulos = novas['unidade'].astype(str) + ' | ' + novas['tipoconsulta'].astype(str)
+    estratos = list(dict.fromkeys(estado['estratos'] + list(rotulos.unique())))
+    codigos = pd.Index(estratos).get_indexer(rotulos)
+
+    N = np.bincount(codigos, minlength=len(estratos))
+    N[:len(estado['N'])] += estado['N']
+    limiar = np.maximum(fracao, minimo_estrato / np.maximum(N, 1))
+
+    u = np.random.default_rng([semente, estado['n']]).random(len(novas))
+    sorteadas = u < limiar[codigos]
+    linhas = pd.concat([
+        estado['linhas'],
+        novas[sorteadas].assign(estrato=codigos[sorteadas], u=u[sorteadas]),
+    ])
+    linhas = linhas[linhas['u'].to_numpy() < limiar[linhas['estrato'].to_numpy()]]
+
+    return {
+        'n': len(df),
+        'assinatura': assinatura,
+        'estratos': estratos,
+        'unidade_estrato': [e.split(' | ', 1)[0] for e in estratos],
+        'tipo_estrato': [e.split(' | ', 1)[1] for e in estratos],
+        'N': N,
+        'linhas': linhas,
+    }
+
+
+def _total_estratificado(amostra, dominio, y):
+    """Total de y no domínio por estrato e sua variância (estimador de Horvitz-Thompson)"""
+    k = len(amostra['N'])
+    estrato = amostra['linhas']['estrato'].to_numpy()
+    y = np.where(dominio, y, 0.0)
+    n_h = np.bincount(estrato, minlength=k).astype(np.float64)
+    soma = np.bincount(estrato, weights=y, minlength=k)
+    soma2 = np.bincount(estrato, weights=y * y, minlength=k)
+    N_h = amostra['N'].astype(np.float64)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        media = np.where(n_h > 0, soma / n_h, 0.0)
+        s2 = np.where(n_h > 1, (soma2 - n_h * media ** 2) / (n_h - 1), 0.0)
+        var = np.where(n_h > 0, N_h ** 2 * (1 - n_h / N_h) * s2 / n_h, 0.0)
+    return N_h * media, np.maximum(var, 0.0)
+
+
+def estimar_visao(amostra, inicio, fim, unidades=None, z=1.96):
+    """Versão aproximada de calcular_visao a partir da amostra estratificada.
+
+    Retorna as mesmas chaves, mais 'ic' com a meia-largura do intervalo de
+    confiança (95% por padrão) de total, faturamento e retorno médio.
+    """
+    linhas = amostra['linhas']
+    datas = linhas['dataconsulta'].dt.date
+    dominio = ((datas >= inicio) & (datas <= fim)).to_numpy()
+    if unidades:
+        dominio &= linhas['unidade'].isin(unidades).to_numpy()
+
+    valor = linhas['valor'].to_numpy(dtype=np.float64)
+    retorno = linhas['retornodaconsulta'].to_numpy(dtype=np.float64)
+    com_retorno = ~np.isnan(retorno)
+
+    qtd_h, var_qtd_h = _total_estratificado(amostra, dominio, np.ones(len(linhas)))
+    valor_h, var_valor_h = _total_estratificado(amostra, dominio, np.nan_to_num(valor))
+    ret_h, _ = _total_estratificado(amostra, dominio, np.where(com_retorno, retorno, 0.0))
+    ret_qtd_h, _ = _total_estratificado(amostra, dominio, com_retorno.astype(np.float64))
+
+    ret_qtd = ret_qtd_h.sum()
+    retorno_medio = float(ret_h.sum() / ret_qtd) if ret_qtd > 0 else 0.0
+    # Razão: variância pela linearização z = y - R·x
+    _, var_ret_h = _total_estratificado(
+        amostra, dominio & com_retorno, np.where(com_retorno, retorno, 0.0) - retorno_medio)
+    ic_retorno = z * np.sqrt(var_ret_h.sum()) / ret_qtd if ret_qtd > 0 else 0.0
+
+    por_estrato = pd.DataFrame({
+        'unidade': amostra['unidade_estrato'],
+        'tipoconsulta': amostra['tipo_estrato'],
+        'Total': qtd_h,
+        'valor': valor_h,
+    })
+    por_unidade = por_estrato.groupby('unidade')[['Total', 'valor']].sum().reset_index()
+    por_tipo = por_estrato.groupby('tipoconsulta')[['Total', 'valor']].sum().reset_index()
+
+    return {
+        'total': float(qtd_h.sum()),
+        'unidades_ativas': int((por_unidade['Total'] > 0).sum()),
+        'faturamento': float(valor_h.sum()),
+        'retorno_medio': retorno_medio,
+        'por_unidade': por_unidade[por_unidade['Total'] > 0],
+        'por_tipo': por_tipo[por_tipo['Total'] > 0],
+        'ic': {
+            'total': float(z * np.sqrt(var_qtd_h.sum())),
+            'faturamento': float(z * np.sqrt(var_valor_h.sum())),
+            'retorno_medio': float(ic_retorno),
+        },
+    }
+
+
+# ============== PROJEÇÃO DE RETORNOS ==============
+def atualizar_projecao_retornos(df, estado=None):
+    """Retornos esperados por data × unidade × especialidade.
+
+    Cada consulta é espalhada para a data dataconsulta + retornodaconsulta
+    com um único np.bincount sobre a chave (dia do retorno, unidade,
+    especialidade). Se o dataset só recebeu linhas novas no fim e elas não
+    trazem unidade/especialidade nova nem datas anteriores à origem, apenas
+    essas linhas são somadas à projeção anterior; senão ela é refeita.
+    """
+    inicio = 0
+    anexado, assinatura = verificar_anexado(df, estado)
+    if anexado:
+        novas = df.iloc[estado['n']:]
+        compativel = (
+            novas['unidade'].isin(estado['unidades']).all()
+            and novas['tipoconsulta'].isin(estado['tipos']).all()
+            and (len(novas) == 0 or novas['dataconsulta'].min().normalize() >= estado['dia0'])
+        )
+        if compativel:
+            inicio = estado['n']
+
+    if inicio == 0:
+        dia0 = df['dataconsulta'].min().normalize() if len(df) else pd.Timestamp('1970-01-01')
+        unidades = sorted(df['unidade'].unique())
+        tipos = sorted(df['tipoconsulta'].unique())
+        retornos = np.zeros((0, len(unidades), len(tipos)), dtype=np.int64)
+    else:
+        dia0, unidades, tipos, retornos = estado['dia0'], estado['unidades'], estado['tipos'], estado['retornos']
+
+    novas = df.iloc[inicio:]
+    retorno = novas['retornodaconsulta'].to_numpy(dtype=np.float64)
+    validas = ~np.isnan(retorno) & (retorno >= 0)
+    dia_retorno = (
+        (novas['dataconsulta'].dt.normalize() - dia0).dt.days.to_numpy(dtype=np.int64)[validas]
+        + retorno[validas].astype(np.int64)
+    )
+    cod_u = pd.Categorical(novas['unidade'], categories=unidades).codes[validas].astype(np.int64)
+    cod_t = pd.Categorical(novas['tipoconsulta'], categories=tipos).codes[validas].astype(np.int64)
+
+    n_u, n_t = len(unidades), len(tipos)
+    n_d = max(retornos.shape[0], int(dia_retorno.max()) + 1 if len(dia_retorno) else 0)
+    chave = (dia_retorno * n_u + cod_u) * n_t + cod_t
+    acumulado = np.zeros((n_d, n_u, n_t), dtype=np.int64)
+    acumulado[:retornos.shape[0]] = retornos
+    acumulado += np.bincount(chave, minlength=n_d * n_u * n_t).reshape(n_d, n_u, n_t)
+
+    return {
+        'n': len(df),
+        'assinatura': assinatura,
+        'dia0': dia0,
+        'unidades': unidades,
+        'tipos': tipos,
+        'retornos': acumulado,
+        'linhas_processadas': len(novas),
+    }
+
+
+def projetar_carga(projecao, cubo, inicio, fim, unidades=None):
+    """Retornos previstos e consultas já registradas por data no intervalo.
+
+    Retorna (por_data, por_celula): a carga diária (Retornos, Agendadas,
+    Total) e o total de retornos do intervalo por unidade × especialidade.
+    """
+    datas = pd.date_range(pd.Timestamp(inicio), pd.Timestamp(fim), freq='D')
+
+    fatia = fatia_dias({'qtd': projecao['retornos'], 'dia0': projecao['dia0']}, inicio, fim)
+    idx_u = indices_unidades({'unidades': projecao['unidades']}, unidades)
+    retornos = np.zeros((len(datas), len(idx_u), len(projecao['tipos'])), dtype=np.int64)
+    deslocamento = (projecao['dia0'] + pd.Timedelta(days=fatia.start) - datas[0]).days if len(datas) else 0
+    retornos[deslocamento:deslocamento + fatia.stop - fatia.start] = projecao['retornos'][fatia][:, idx_u, :]
+
+    agendadas = np.zeros(len(datas), dtype=np.int64)
+    fatia_cubo = fatia_dias(cubo, inicio, fim)
+    deslocamento_cubo = (cubo['dia0'] + pd.Timedelta(days=fatia_cubo.start) - datas[0]).days if len(datas) else 0
+    agendadas[deslocamento_cubo:deslocamento_cubo + fatia_cubo.stop - fatia_cubo.start] = (
+        cubo['qtd'][fatia_cubo][:, indices_unidades(cubo, unidades), :].sum(axis=(1, 2))
+    )
+
+    por_data = pd.DataFrame({
+        'Data': datas,
+        'Retornos': retornos.sum(axis=(1, 2)),
+        'Agendadas': agendadas,
+    })
+    por_data['Total'] = por_data['Retornos'] + por_data['Agendadas']
+
+    n_t = len(projecao['tipos'])
+    por_celula = pd.DataFrame({
+        'unidade': np.repeat([projecao['unidades'][i] for i in idx_u], n_t),
+        'tipoconsulta': np.tile(projecao['tipos'], len(idx_u)),
+        'Retornos': retornos.sum(axis=0).ravel(),
+    })
+    return por_data, por_celula[por_celula['Retornos'] > 0].reset_index(drop=True)
+
+
+# ============== SNAPSHOTS COMPARTILHADOS ==============
+def versao_publicada(raiz):
+    """Lê qual versão do snapshot está publicada (None se nenhuma)"""
+    try:
+        with open(os.path.join(raiz, ARQUIVO_ATUAL), encoding='utf-8') as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def publicar_snapshot(df, raiz, versao, quarentena=None, manter=2):
+    """Grava dataset e cubo como .npy e troca a versão publicada atomicamente.
+
+    A versão nova é escrita numa pasta temporária, renomeada para o nome
+    definitivo e só então o ponteiro ATUAL é substituído com os.replace.
+    Workers que ainda mapeiam a versão anterior continuam válidos; as
+    versões mais antigas que `manter` são removidas.
+    """
+    os.makedirs(raiz, exist_ok=True)
+    pasta = os.path.join(raiz, versao)
+
+    if not os.path.isdir(pasta):
+        tmp = os.path.join(raiz, f".tmp-{versao}-{os.getpid()}")
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+
+        cubo = construir_cubo(df)
+        np.save(os.path.join(tmp, 'dataconsulta.npy'), df['dataconsulta'].to_numpy(dtype='datetime64[ns]'))
+        np.save(os.path.join(tmp, 'valor.npy'), df['valor'].to_numpy(dtype=np.float64))
+        np.save(os.path.join(tmp, 'retornodaconsulta.npy'), df['retornodaconsulta'].to_numpy(dtype=np.float64))
+        categorias = {'unidade': cubo['unidades'], 'tipoconsulta': cubo['tipos']}
+        for coluna, valores in categorias.items():
+            codigos = pd.Categorical(df[coluna], categories=valores).codes
+            np.save(os.path.join(tmp, f'{coluna}.npy'), codigos)
+        for nome in _ARRAYS_CUBO:
+            np.save(os.path.join(tmp, f'cubo_{nome}.npy'), cubo[nome])
+        for coluna, esboco in cubo['esbocos'].items():
+            np.save(os.path.join(tmp, f'esboco_{coluna}.npy'), esboco['contagens'])
+        if quarentena is None:
+            quarentena = pd.DataFrame(columns=['linha', *COLUNAS_OBRIGATORIAS, 'motivo'])
+        quarentena.to_csv(os.path.join(tmp, 'quarentena.csv'), index=False)
+
+        meta = {
+            'versao': versao,
+            'formato': FORMATO_SNAPSHOT,
+            'linhas': int(len(df)),
+            'dia0': cubo['dia0'].isoformat(),
+            'categorias': categorias,
+            'esbocos': {
+                coluna: {'gamma': esboco['gamma'], 'indice_min': esboco['indice_min']}
+                for coluna, esboco in cubo['esbocos'].items()
+            },
+            'publicado_em': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        }
+        with open(os.path.join(tmp, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.rename(tmp, pasta)
+    else:
+        # Versão republicada (conteúdo voltou a um estado anterior): vira a mais recente
+        os.utime(pasta)
+
+    ponteiro_tmp = os.path.join(raiz, f".{ARQUIVO_ATUAL}-{os.getpid()}")
+    with open(ponteiro_tmp, 'w', encoding='utf-8') as f:
+        f.write(versao)
+    os.replace(ponteiro_tmp, os.path.join(raiz, ARQUIVO_ATUAL))
+
+    _limpar_versoes_antigas(raiz, versao, manter)
+    return pasta
+
+
+def _limpar_versoes_antigas(raiz, versao_atual, manter):
+    pastas = [
+        p for p in os.listdir(raiz)
+        if not p.startswith('.') and os.path.isdir(os.path.join(raiz, p))
+    ]
+    pastas.sort(key=lambda p: os.path.getmtime(os.path.join(raiz, p)), reverse=True)
+    antigas = [p for p in pastas if p != versao_atual][max(manter - 1, 0):]
+    for p in antigas:
+        # Em Linux, arquivos já mapeados por algum worker seguem válidos após o unlink
+        shutil.rmtree(os.path.join(raiz, p), ignore_errors=True)
+
+
+def abrir_snapshot(raiz, versao):
+    """Mapeia um snapshot publicado em modo somente leitura.
+
+    Retorna (df, cubo, quarentena). As colunas do DataFrame e os arrays do cubo são
+    visões sobre os arquivos mapeados, então vários processos abrindo a
+    mesma versão compartilham as mesmas páginas de memória.
+    """
+    pasta = os.path.join(raiz, versao)
+    with open(os.path.join(pasta, 'meta.json'), encoding='utf-8') as f:
+        meta = json.load(f)
+    # Snapshots anteriores ao campo 'formato' são do formato 1
+    formato = meta.get('formato', 1)
+    if formato != FORMATO_SNAPSHOT:
+        raise ValueError(
+            f"Snapshot {versao} está no formato {formato}, esperado {FORMATO_SNAPSHOT}; "
+            "republique com publicar_dados.py"
+        )
+
+    def _mapear(nome):
+        return np.load(os.path.join(pasta, f'{nome}.npy'), mmap_mode='r')
+
+    colunas = {
+        'dataconsulta': _mapear('dataconsulta'),
+        'unidade': pd.Categorical.from_codes(_mapear('unidade'), meta['categorias']['unidade']),
+        'tipoconsulta': pd.Categorical.from_codes(_mapear('tipoconsulta'), meta['categorias']['tipoconsulta']),
+        'valor': _mapear('valor'),
+        'retornodaconsulta': _mapear('retornodaconsulta'),
+    }
+    df = pd.DataFrame(colunas, copy=False)
+
+    cubo = {
+        'dia0': pd.Timestamp(meta['dia0']),
+        'unidades': meta['categorias']['unidade'],
+        'tipos': meta['categorias']['tipoconsulta'],
+    }
+    for nome in _ARRAYS_CUBO:
+        cubo[nome] = _mapear(f'cubo_{nome}')
+    cubo['esbocos'] = {
+        coluna: {**parametros, 'contagens': _mapear(f'esboco_{coluna}')}
+        for coluna, parametros in meta['esbocos'].items()
+    }
+    quarentena = pd.read_csv(os.path.join(pasta, 'quarentena.csv'), dtype=str)
+    return df, cubo, quarentena
@@ -1,13 +1,27 @@
 import pandas as pd
 import streamlit as st
 import plotly.express as px
+import streamlit.components.v1 as components
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-import requests
-from io import StringIO
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
 import numpy as np
 
+from dados import (
+    HORIZONTE_PREVISAO, abrir_snapshot, atualizar_amostra, atualizar_anomalias,
+    assinatura_arquivo, atualizar_projecao_retornos, baixar_csv, construir_cubo, contar_motivos,
+    estimar_visao, fatia_dias, indices_unidades, ler_arquivo_consultas, ler_consultas, listar_anomalias,
+    matriz_dia_semana_unidade, matriz_unidade_especialidade, prever_cubo, previsao_agregada, projetar_carga,
+    quantis_esboco, quantis_esboco_celulas, serie_diaria,
+    versao_do_arquivo, versao_do_conteudo, versao_publicada,
+)
+
 # Configuração padrão do Plotly para evitar kwargs depreciados
 PLOTLY_CONFIG = {
     "displaylogo": False,
@@ -27,264 +41,136 @@ st.set_page_config(
 )
 
 # ============== CSS ==============
-st.markdown("""
-    <style>
-    /* Importar fontes melhores */
-    @import url('https://fonts.googleapis.com/css2?family=Inter:wght@400;500;600;700;800&display=swap');
-    
-    /* Body e fundo */
-    * {
-        font-family: 'Inter', sans-serif;
-    }
-    
-    html, body {
-        background: linear-gradient(135deg, #0f1419 0%, #1a1f2e 50%, #0f1419 100%);
-        color: #e4e6eb;
-    }
+ARQUIVO_CSS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dashboard.css")
 
-    /* Escopo do app principal para evitar efeitos colaterais */
-    .stApp, .main, [data-testid="stMainBlockContainer"], [data-testid="stSidebar"], [data-testid="stHeader"], [data-testid="stToolbar"] {
-        box-sizing: border-box;
-    }
-    
-    /* Main container */
-    .main {
-        background: transparent;
-        padding: 0;
-    }
-    
-    [data-testid="stMainBlockContainer"] {
-        padding: 2rem 3rem;
-        background: linear-gradient(135deg, #0f1419 0%, #1a1f2e 50%, #0f1419 100%);
-    }
-    
-    /* Sidebar */
-    [data-testid="stSidebar"] > div:first-child {
-        background: linear-gradient(180deg, #1a1f2e 0%, #0f1419 100%);
-    }
-    
-    [data-testid="stSidebar"] {
-        background: linear-gradient(180deg, #1a1f2e 0%, #0f1419 100%);
-        border-right: 2px solid rgba(0, 212, 255, 0.1);
-    }
-    
-    /* Header/Title Container - Fundo Escuro */
-    [data-testid="stHeader"] {
-        background: linear-gradient(135deg, #0f1419 0%, #1a1f2e 50%, #0f1419 100%) !important;
-    }
-    
-    [data-testid="stToolbar"] {
-        background: linear-gradient(135deg, #0f1419 0%, #1a1f2e 50%, #0f1419 100%) !important;
-    }
-    
-    /* Garantir que h1 nunca tenha fundo branco */
-    h1 {
-        background-color: transparent !important;
-        background: transparent !important;
-    }
-    
-    /* Títulos - GRANDES E LEGÍVEIS */
-    h1 {
-        font-size: 2.8rem !important;
-        font-weight: 800 !important;
-        color: #00d4ff !important;
-        text-shadow: 0 4px 15px rgba(0, 212, 255, 0.3);
-        margin-bottom: 0.5rem !important;
-        letter-spacing: -0.5px;
-    }
-    
-    h2 {
-        font-size: 1.8rem !important;
-        font-weight: 700 !important;
-        color: #00d4ff !important;
-        margin-top: 1.5rem !important;
-        margin-bottom: 1rem !important;
-    }
-    
-    h3 {
-        font-size: 1.3rem !important;
-        font-weight: 600 !important;
-        color: #e4e6eb !important;
-        margin-top: 1rem !important;
-    }
-    
-    /* Parágrafos e texto */
-    p, span, label {
-        font-size: 1rem !important;
-        color: #e4e6eb !important;
-        line-height: 1.5;
-    }
-    
-    /* Subtítulo */
-    .subtitle {
-        font-size: 1.1rem;
-        color: #00d4ff;
-        font-weight: 500;
-        margin-bottom: 2rem;
-    }
-    
-    /* Divider */
-    hr {
-        border: none;
-        height: 2px;
-        background: linear-gradient(90deg, rgba(0,212,255,0) 0%, rgba(0,212,255,0.5) 50%, rgba(0,212,255,0) 100%);
-        margin: 2rem 0;
-    }
-    
-    /* Cards de Métrica - MUITO MAIOR */
-    .metric-card {
-        background: linear-gradient(135deg, rgba(15, 52, 96, 0.6) 0%, rgba(22, 33, 62, 0.4) 100%);
-        border: 2px solid rgba(0, 212, 255, 0.2);
-        border-radius: 16px;
-        padding: 2rem;
-        box-shadow: 0 8px 32px rgba(0, 0, 0, 0.3),
-                    inset 0 1px 1px rgba(255, 255, 255, 0.1);
-        backdrop-filter: blur(10px);
-        transition: all 0.3s ease;
-    }
-    
-    .metric-card:hover {
-        border: 2px solid rgba(0, 212, 255, 0.5);
-        box-shadow: 0 12px 48px rgba(0, 212, 255, 0.15),
-                    inset 0 1px 1px rgba(255, 255, 255, 0.1);
-        transform: translateY(-2px);
-    }
-    
-    .metric-value {
-        font-size: 2.5rem !important;
-        font-weight: 800 !important;
-        color: #00d4ff !important;
-        margin: 1rem 0;
-    }
-    
-    .metric-label {
-        font-size: 0.95rem !important;
-        color: #a0a6af !important;
-        font-weight: 600;
-        text-transform: uppercase;
-        letter-spacing: 0.5px;
-    }
-    
-    .metric-change {
-        font-size: 1.1rem !important;
-        font-weight: 700 !important;
-        margin-top: 0.8rem;
-    }
-    
-    .metric-up {
-        color: #00ff88 !important;
-    }
-    
-    .metric-down {
-        color: #ff6b6b !important;
-    }
-    
-    /* Abas */
-    .stTabs [data-baseweb="tab-list"] {
-        gap: 2rem;
-        border-bottom: 2px solid rgba(0, 212, 255, 0.1);
-    }
-    
-    .stTabs [data-baseweb="tab-list"] button {
-        font-size: 1.1rem !important;
-        font-weight: 600 !important;
-        color: #a0a6af !important;
-        padding: 1rem 1.5rem !important;
-        border-bottom: 3px solid transparent !important;
-        transition: all 0.3s ease;
-    }
-    
-    .stTabs [data-baseweb="tab-list"] button[aria-selected="true"] {
-        color: #00d4ff !important;
-        border-bottom: 3px solid #00d4ff !important;
-    }
-    
-    /* Buttons */
-    .stButton > button {
-        font-size: 1rem !important;
-        font-weight: 600 !important;
-        padding: 0.75rem 1.5rem !important;
-        border: none !important;
-        border-radius: 8px !important;
-        background: linear-gradient(135deg, #00d4ff 0%, #0099cc 100%) !important;
-        color: white !important;
-        transition: all 0.3s ease;
-        box-shadow: 0 4px 15px rgba(0, 212, 255, 0.2);
-    }
-    
-    .stButton > button:hover {
-        background: linear-gradient(135deg, #00e6ff 0%, #00aadd 100%) !important;
-        box-shadow: 0 6px 25px rgba(0, 212, 255, 0.4);
-        transform: translateY(-2px);
-    }
-    
-    /* Input fields */
-    .stDateInput > div > div > input,
-    .stSelectbox > div > div > select,
-    .stMultiSelect > div > div > div {
-        background-color: rgba(15, 52, 96, 0.5) !important;
-        border: 1px solid rgba(0, 212, 255, 0.2) !important;
-        color: #e4e6eb !important;
-        border-radius: 8px !important;
-        padding: 0.75rem !important;
-        font-size: 1rem !important;
-    }
-    
-    .stDateInput > div > div > input:focus,
-    .stSelectbox > div > div > select:focus {
-        border: 2px solid rgba(0, 212, 255, 0.5) !important;
-        box-shadow: 0 0 10px rgba(0, 212, 255, 0.2) !important;
-    }
-    
-    /* Mensagens */
-    .stSuccess {
-        background-color: rgba(0, 255, 136, 0.1) !important;
-        border: 1px solid rgba(0, 255, 136, 0.3) !important;
-        border-radius: 8px !important;
-        color: #00ff88 !important;
-    }
-    
-    .stError {
-        background-color: rgba(255, 107, 107, 0.1) !important;
-        border: 1px solid rgba(255, 107, 107, 0.3) !important;
-        border-radius: 8px !important;
-        color: #ff6b6b !important;
-    }
-    
-    .stInfo {
-        background-color: rgba(0, 212, 255, 0.1) !important;
-        border: 1px solid rgba(0, 212, 255, 0.3) !important;
-        border-radius: 8px !important;
-        color: #00d4ff !important;
-    }
-    
-    /* Dataframe */
-    .stDataFrame {
-        font-size: 1rem !important;
-    }
-    
-    .stDataFrame table {
-        background-color: rgba(15, 52, 96, 0.3) !important;
-        border-radius: 8px !important;
-    }
-    </style>
-""", unsafe_allow_html=True)
+@st.cache_resource
+def carregar_css():
+    """Folha de estilo lida do disco uma vez por processo"""
+    with open(ARQUIVO_CSS, encoding="utf-8") as f:
+        return f.read()
+
+def injetar_estilo():
+    """Injeta a folha de estilo no <head> da página uma vez por sessão.
+
+    O <style> vai para o documento pai, fora da árvore de elementos do
+    Streamlit, então continua aplicado nos reruns seguintes sem ser reenviado.
+    """
+    if st.session_state.get("_estilo_injetado"):
+        return
+    components.html(f"""
+        <script>
+            const doc = window.parent.document;
+            if (!doc.getElementById("dashboard-estilo")) {{
+                const estilo = doc.createElement("style");
+                estilo.id = "dashboard-estilo";
+                estilo.textContent = {json.dumps(carregar_css())};
+                doc.head.appendChild(estilo);
+            }}
+        </script>
+    """, height=0)
+    st.session_state["_estilo_injetado"] = True
+
+injetar_estilo()
 
 # ============== CARREGAR DADOS ==============
+# Modo multiprocesso: os workers mapeiam o snapshot publicado por publicar_dados.py
+SNAPSHOT_DIR = os.environ.get("CONSULTAS_SNAPSHOT_DIR")
+
+# Fonte local (on-prem): CSV/Parquet/Arrow em disco, relido só quando o arquivo muda
+ARQUIVO_DADOS = os.environ.get("CONSULTAS_ARQUIVO")
+
+# Modo progressivo: a partir de quantas linhas no período vale mostrar a estimativa
+LIMIAR_PROGRESSIVO = int(os.environ.get("CONSULTAS_LIMIAR_PROGRESSIVO", "1000000"))
+
+# Filtros populares pré-calculados no aquecimento do cache
+ARQUIVO_PRESETS = os.environ.get(
+    "CONSULTAS_PRESETS",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "presets_aquecimento.json"),
+)
+
+# Segundos entre as verificações, em segundo plano, de uma nova versão dos dados para aquecer
+INTERVALO_AQUECIMENTO = int(os.environ.get("CONSULTAS_INTERVALO_AQUECIMENTO", "60"))
+
+# Log do aquecimento; handler próprio porque o logger raiz do Streamlit descarta INFO
+LOGGER = logging.getLogger(__name__)
+if not LOGGER.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+    LOGGER.addHandler(_handler)
+    LOGGER.setLevel(logging.INFO)
+    LOGGER.propagate = False
+
 @st.cache_data(ttl=300)
 def carregar_dados_github():
     """Carrega CSV do GitHub com jsDelivr"""
-    url = "https://cdn.jsdelivr.net/gh/rafael-albuquerque07/consultas-medicas@main/consultas.csv"
     try:
-        response = requests.get(url)
-        response.raise_for_status()
-        df = pd.read_csv(StringIO(response.text))
-        df['dataconsulta'] = pd.to_datetime(df['dataconsulta'])
-        return df
+        texto = baixar_csv()
+        df, quarentena = ler_consultas(texto)
+        return df, quarentena, versao_do_conteudo(texto)
     except Exception as e:
         st.error(f"❌ Erro ao carregar dados: {e}")
         st.info("💡 Certifique-se de que a URL do GitHub está correta")
-        return None
+        return None, None, None
+
+@st.cache_data(max_entries=4)
+def versao_arquivo_cache(caminho, assinatura):
+    """Hash do conteúdo, recalculado só quando inode, tamanho ou mtime mudam"""
+    return versao_do_arquivo(caminho)
+
+@st.cache_data(max_entries=2)
+def carregar_dados_arquivo(caminho, versao):
+    """Lê o arquivo local uma vez por versão do conteúdo (sem TTL)"""
+    df, quarentena = ler_arquivo_consultas(caminho)
+    return df, quarentena
+
+@st.cache_resource(max_entries=2)
+def calcular_cubo(versao, _df):
+    """Pré-agregados dia × unidade × especialidade (um por versão do dataset).
+
+    cache_resource: com os esboços o cubo chega a centenas de MB e não pode
+    ser copiado a cada rerun; as sessões só leem os arrays compartilhados.
+    """
+    return construir_cubo(_df)
+
+@st.cache_data(max_entries=2)
+def calcular_previsao(versao, _cubo):
+    """Previsão de todas as séries unidade × especialidade (uma por versão do dataset)"""
+    return prever_cubo(_cubo)
+
+@st.cache_resource(max_entries=2)
+def abrir_snapshot_cache(raiz, versao):
+    """Mapeia o snapshot uma vez por processo; as sessões compartilham os arrays"""
+    return abrir_snapshot(raiz, versao)
+
+def carregar_dados():
+    """Retorna (df, cubo, quarentena, versao) da fonte configurada"""
+    if SNAPSHOT_DIR:
+        versao = versao_publicada(SNAPSHOT_DIR)
+        if versao is None:
+            st.error(f"❌ Nenhum snapshot publicado em {SNAPSHOT_DIR}")
+            st.info("💡 Rode `python publicar_dados.py` apontando para a mesma pasta")
+            return None, None, None, None
+        try:
+            df, cubo, quarentena = abrir_snapshot_cache(SNAPSHOT_DIR, versao)
+        except Exception as e:
+            st.error(f"❌ Erro ao abrir o snapshot {versao}: {e}")
+            st.info(f"💡 Republique com `python publicar_dados.py {SNAPSHOT_DIR}`")
+            return None, None, None, None
+        return df, cubo, quarentena, versao
+
+    if ARQUIVO_DADOS:
+        try:
+            versao = versao_arquivo_cache(ARQUIVO_DADOS, assinatura_arquivo(ARQUIVO_DADOS))
+            df, quarentena = carregar_dados_arquivo(ARQUIVO_DADOS, versao)
+        except Exception as e:
+            st.error(f"❌ Erro ao carregar dados: {e}")
+            st.info(f"💡 Verifique o arquivo configurado em CONSULTAS_ARQUIVO ({ARQUIVO_DADOS})")
+            return None, None, None, None
+    else:
+        df, quarentena, versao = carregar_dados_github()
+        if df is None:
+            return None, None, None, None
+    return df, calcular_cubo(versao, df), quarentena, versao
 
 def calcular_variacao(atual, anterior):
     # Tratamento robusto para evitar NaN e divisão por zero
@@ -305,12 +191,300 @@ def formatar_variacao(variacao):
     else:
         return f"→ {variacao:.1f}%"
 
+def adicionar_previsao(fig, previsao, cor, cor_banda):
+    """Desenha a previsão tracejada e a banda de 95% depois da série histórica"""
+    fig.add_trace(go.Scatter(
+        x=previsao['Data'], y=previsao['Superior'],
+        mode='lines', line=dict(width=0), hoverinfo='skip', showlegend=False
+    ))
+    fig.add_trace(go.Scatter(
+        x=previsao['Data'], y=previsao['Inferior'],
+        mode='lines', line=dict(width=0), fill='tonexty', fillcolor=cor_banda,
+        name='IC 95%', hoverinfo='skip', showlegend=False
+    ))
+    fig.add_trace(go.Scatter(
+        x=previsao['Data'], y=previsao['Previsão'],
+        mode='lines', line=dict(color=cor, dash='dash', width=2),
+        name='Previsão', showlegend=False
+    ))
+
+def marcar_anomalias(fig, serie, coluna, datas_anomalas):
+    """Marca com um X vermelho os dias da série que têm alguma anomalia"""
+    marcados = serie[serie['Data'].isin(datas_anomalas)]
+    if marcados.empty:
+        return
+    fig.add_trace(go.Scatter(
+        x=marcados['Data'], y=marcados[coluna],
+        mode='markers', name='Anomalia', showlegend=False,
+        marker=dict(symbol='x', size=14, color='#ff3b3b', line=dict(width=2, color='#ffffff'))
+    ))
+
+def renderizar_cards(metricas):
+    """Renderiza uma linha de cards de métricas como um único elemento.
+
+    Cada métrica é um dict com 'rotulo' e 'valor' (card simples) ou
+    'valor_a'/'valor_b' (comparação A → B, com 'tamanho_fonte' opcional).
+    O rodapé mostra 'variacao' (% com seta e cor) ou, na falta dela, 'nota'.
+    """
+    cards = []
+    for m in metricas:
+        if 'valor_a' in m:
+            fonte = m.get('tamanho_fonte', '1.8rem')
+            corpo = (
+                "<div style='display: flex; justify-content: space-between; align-items: center; margin: 1rem 0;'>"
+                "<div style='text-align: center;'>"
+                f"<div style='font-size: {fonte}; font-weight: 700; color: #00d4ff;'>{m['valor_a']}</div>"
+                "<div style='font-size: 0.8rem; color: #a0a6af;'>Período A</div>"
+                "</div>"
+                "<div style='color: #666; font-size: 1.5rem;'>→</div>"
+                "<div style='text-align: center;'>"
+                f"<div style='font-size: {fonte}; font-weight: 700; color: #ff6b6b;'>{m['valor_b']}</div>"
+                "<div style='font-size: 0.8rem; color: #a0a6af;'>Período B</div>"
+                "</div>"
+                "</div>"
+            )
+            alinhamento = " style='text-align: center;'"
+        else:
+            corpo = f"<div class='metric-value'>{m['valor']}</div>"
+            alinhamento = ""
+
+        if m.get('variacao') is not None:
+            direcao = "up" if m['variacao'] >= 0 else "down"
+            rodape = f"<div class='metric-change metric-{direcao}'{alinhamento}>{formatar_variacao(m['variacao'])}</div>"
+        else:
+            rodape = f"<div class='metric-change'{alinhamento}>{m.get('nota', '')}</div>"
+
+        cards.append(f"<div class='metric-card'><div class='metric-label'>{m['rotulo']}</div>{corpo}{rodape}</div>")
+
+    st.markdown(f"<div class='metric-grid'>{''.join(cards)}</div>", unsafe_allow_html=True)
+
+def _safe_mean(series):
+    m = float(series.mean()) if len(series) > 0 else 0.0
+    return 0.0 if pd.isna(m) else m
+
+def periodo_anterior(inicio, fim):
+    """Período de mesma duração imediatamente antes de [inicio, fim]"""
+    dias_diferenca = (pd.to_datetime(fim) - pd.to_datetime(inicio)).days + 1
+    data_inicio_anterior = pd.to_datetime(inicio) - timedelta(days=dias_diferenca)
+    data_fim_anterior = pd.to_datetime(inicio) - timedelta(days=1)
+    return data_inicio_anterior.date(), data_fim_anterior.date()
+
+# Entradas do cache de visões (calcular_visao) e do registro que o acompanha
+MAX_VISOES = 128
+
+@st.cache_data(max_entries=MAX_VISOES)
+def calcular_visao(versao, inicio, fim, unidades, _df):
+    """Indicadores e agrupamentos de um período; cache por versão do dataset.
+
+    `unidades` deve ser uma tupla ordenada para que filtros equivalentes
+    caiam na mesma entrada do cache.
+    """
+    filtrado = _df[
+        (_df['dataconsulta'].dt.date >= inicio) &
+        (_df['dataconsulta'].dt.date <= fim)
+    ]
+    if unidades:
+        filtrado = filtrado[filtrado['unidade'].isin(unidades)]
+
+    return {
+        'total': len(filtrado),
+        'unidades_ativas': filtrado['unidade'].nunique(),
+        'faturamento': float(filtrado['valor'].sum()),
+        'retorno_medio': _safe_mean(filtrado['retornodaconsulta']),
+        'por_unidade': filtrado.groupby('unidade', observed=True).agg(
+            Total=('valor', 'size'), valor=('valor', 'sum')).reset_index(),
+        'por_tipo': filtrado.groupby('tipoconsulta', observed=True).agg(
+            Total=('valor', 'size'), valor=('valor', 'sum')).reset_index(),
+    }
+
+@st.cache_resource
+def _registro_visoes():
+    """Chaves de calcular_visao em ordem de uso, espelhando o LRU do cache_data"""
+    return {'lock': threading.Lock(), 'chaves': OrderedDict()}
+
+def obter_visao(versao, inicio, fim, unidades, df):
+    """calcular_visao registrando o acesso, para visao_em_cache saber o que está no cache.
+
+    O cache_data descarta a entrada menos usada recentemente ao passar de
+    MAX_VISOES; como todo acesso passa por aqui, o registro (LRU do mesmo
+    tamanho) descarta as mesmas chaves.
+    """
+    visao = calcular_visao(versao, inicio, fim, unidades, df)
+    registro = _registro_visoes()
+    chave = (versao, inicio, fim, unidades)
+    with registro['lock']:
+        registro['chaves'][chave] = True
+        registro['chaves'].move_to_end(chave)
+        while len(registro['chaves']) > MAX_VISOES:
+            registro['chaves'].popitem(last=False)
+    return visao
+
+def visao_em_cache(versao, inicio, fim, unidades):
+    """Se o período já está no cache de calcular_visao (sem calcular nem mexer na ordem)"""
+    return (versao, inicio, fim, unidades) in _registro_visoes()['chaves']
+
+@st.cache_data(max_entries=64)
+def calcular_quantis(versao, inicio, fim, unidades, por, _cubo):
+    """Quantis de ticket e retorno por unidade ou especialidade, a partir dos esboços"""
+    return {
+        coluna: quantis_esboco(_cubo['esbocos'][coluna], inicio, fim, _cubo, unidades, por=por)
+        for coluna in ('valor', 'retornodaconsulta')
+    }
+
+@st.cache_data(max_entries=64)
+def calcular_quantis_celulas(versao, inicio, fim, unidades, _cubo):
+    """Tabela de medianas e P90 de ticket e retorno por unidade × especialidade"""
+    q_valor = quantis_esboco_celulas(_cubo['esbocos']['valor'], inicio, fim, _cubo, unidades)
+    q_retorno = quantis_esboco_celulas(_cubo['esbocos']['retornodaconsulta'], inicio, fim, _cubo, unidades)
+    tabela = q_valor.merge(q_retorno, on=['unidade', 'tipoconsulta'], how='left', suffixes=('_valor', '_retorno'))
+    tabela = tabela[['unidade', 'tipoconsulta', 'n_valor', 'q50_valor', 'q90_valor', 'q50_retorno', 'q90_retorno']]
+    tabela.columns = ['Unidade', 'Especialidade', 'Consultas', 'Mediana (R$)', 'P90 (R$)', 'Mediana Retorno (d)', 'P90 Retorno (d)']
+    return tabela
+
+def carregar_presets():
+    """Lê a lista de filtros populares (arquivo ausente ou inválido = nenhum preset)"""
+    try:
+        with open(ARQUIVO_PRESETS, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return []
+    except (OSError, ValueError) as e:
+        LOGGER.warning("Presets de aquecimento ignorados (%s): %s", ARQUIVO_PRESETS, e)
+        return []
+
+def visoes_para_aquecer(df, presets):
+    """Filtros padrão das abas 1 e 2 mais os presets configurados.
+
+    O período anterior (comparação da aba 1) entra para a aba 1 e os
+    presets; os períodos A e B da aba 2 são usados como estão.
+    """
+    data_min = df['dataconsulta'].min().date()
+    data_max = df['dataconsulta'].max().date()
+    todas = tuple(sorted(df['unidade'].unique()))
+
+    periodos_aba1 = [(data_min, data_max, todas)]
+    for preset in presets:
+        try:
+            fim = pd.to_datetime(preset.get('fim', data_max)).date()
+            if 'ultimos_dias' in preset:
+                inicio = max(fim - timedelta(days=int(preset['ultimos_dias']) - 1), data_min)
+            else:
+                inicio = pd.to_datetime(preset.get('inicio', data_min)).date()
+            periodos_aba1.append((inicio, fim, tuple(sorted(preset.get('unidades') or todas))))
+        except (AttributeError, TypeError, ValueError) as e:
+            LOGGER.warning("Preset de aquecimento inválido ignorado (%r): %s", preset, e)
+
+    visoes = []
+    for inicio, fim, unidades in periodos_aba1:
+        visoes.append((inicio, fim, unidades))
+        visoes.append((*periodo_anterior(inicio, fim), unidades))
+    visoes += [
+        (data_min, min(data_min + timedelta(days=2), data_max), todas),    # aba 2, período A
+        (min(data_min + timedelta(days=3), data_max), data_max, todas),    # aba 2, período B
+    ]
+    return list(dict.fromkeys(visoes))
+
+@st.cache_resource
+def _estados_incrementais():
+    """Último resultado de cada etapa incremental do processo, por nome, com a versão"""
+    return {'lock': threading.Lock()}
+
+def _atualizar_incremental(nome, versao, atualizar, dados):
+    """Roda `atualizar(dados, estado_anterior)` e guarda o novo estado da versão"""
+    estados = _estados_incrementais()
+    with estados['lock']:
+        anterior = estados.get(nome)
+        estado = atualizar(dados, anterior[1] if anterior else None)
+        estados[nome] = (versao, estado)
+        return estado
+
+def estado_pronto(nome, versao):
+    """Estado já calculado para a versão, sem disparar o cálculo (None se ainda não existe)"""
+    atual = _estados_incrementais().get(nome)
+    return atual[1] if atual and atual[0] == versao else None
+
+@st.cache_resource(max_entries=2)
+def obter_amostra(versao, _df):
+    """Amostra estratificada da versão, construída uma vez por atualização"""
+    return _atualizar_incremental('amostra', versao, atualizar_amostra, _df)
+
+@st.cache_resource(max_entries=2)
+def obter_anomalias(versao, _cubo):
+    """Detecção de anomalias da versão, recalculando só os dias que mudaram"""
+    return _atualizar_incremental('anomalias', versao, atualizar_anomalias, _cubo)
+
+@st.cache_resource(max_entries=2)
+def obter_projecao(versao, _df):
+    """Projeção de retornos da versão, somando só as linhas anexadas"""
+    return _atualizar_incremental('projecao', versao, atualizar_projecao_retornos, _df)
+
+@st.cache_resource(max_entries=2)
+def aquecer_cache(versao, _df, _cubo):
+    """Pré-calcula a página padrão e os presets uma vez por processo e versão do dataset.
+
+    Inclui a amostra do modo progressivo, que assim fica pronta antes de
+    qualquer usuário precisar dela.
+    """
+    inicio = time.perf_counter()
+    visoes = visoes_para_aquecer(_df, carregar_presets())
+    for data_inicio, data_fim, unidades in visoes:
+        obter_visao(versao, data_inicio, data_fim, unidades, _df)
+    # Aba 1 padrão: período completo, todas as unidades
+    data_inicio, data_fim, unidades = visoes[0]
+    calcular_quantis(versao, data_inicio, data_fim, unidades, 'unidade', _cubo)
+    calcular_quantis_celulas(versao, data_inicio, data_fim, unidades, _cubo)
+    calcular_previsao(versao, _cubo)
+    obter_anomalias(versao, _cubo)
+    obter_projecao(versao, _df)
+    obter_amostra(versao, _df)
+    duracao = time.perf_counter() - inicio
+    LOGGER.info("🔥 Cache aquecido (versão %s): %d visões em %.2fs", versao, len(visoes), duracao)
+
+    estados = _estados_incrementais()
+    with estados['lock']:
+        estados['aquecimento'] = (versao, {'visoes': len(visoes), 'segundos': duracao})
+    return True
+
+def _vigiar_versoes():
+    """Laço do processo: aquece cada versão nova dos dados fora das requisições dos usuários"""
+    while True:
+        try:
+            df_atual, cubo_atual, _, versao = carregar_dados()
+            if df_atual is not None and not df_atual.empty:
+                aquecer_cache(versao, df_atual, cubo_atual)
+        except Exception:
+            LOGGER.exception("❌ Erro no aquecimento do cache")
+        time.sleep(INTERVALO_AQUECIMENTO)
+
+@st.cache_resource
+def iniciar_aquecimento():
+    """Inicia, uma vez por processo, a thread que aquece o cache em segundo plano"""
+    thread = threading.Thread(target=_vigiar_versoes, name="aquecimento-cache", daemon=True)
+    # Fora de uma sessão, cada função cacheada avisaria "missing ScriptRunContext"
+    logging.getLogger("streamlit.runtime.scriptrunner_utils.script_run_context").addFilter(
+        lambda registro: registro.threadName != thread.name
+    )
+    thread.start()
+    return thread
+
 # ============== CARREGAR DADOS ==============
-df = carregar_dados_github()
+iniciar_aquecimento()
+df, cubo, quarentena, versao_dados = carregar_dados()
 
 if df is None:
     st.stop()
 
+if df.empty:
+    st.error(f"❌ Nenhuma linha válida nos dados ({len(quarentena)} em quarentena)")
+    st.dataframe(contar_motivos(quarentena), hide_index=True)
+    st.stop()
+
+aquecimento = estado_pronto('aquecimento', versao_dados)
+if aquecimento:
+    st.sidebar.caption(f"🔥 Cache aquecido: {aquecimento['visoes']} visões em {aquecimento['segundos']:.2f}s")
+else:
+    st.sidebar.caption("🔥 Aquecendo o cache em segundo plano...")
+
 # ============== HEADER ==============
 col_header1, col_header2, col_header3 = st.columns([1, 2, 1])
 with col_header2:
@@ -324,7 +498,7 @@ with col_header2:
 st.markdown("<hr>", unsafe_allow_html=True)
 
 # ============== ABAS PRINCIPAIS ==============
-tab1, tab2, tab3 = st.tabs(["📊 Análise Simples", "🔄 Comparação Períodos", "📋 Dados Completos"])
+tab1, tab2, tab3, tab4 = st.tabs(["📊 Análise Simples", "🔄 Comparação Períodos", "📋 Dados Completos", "🛡️ Qualidade dos Dados"])
 
 # ================================================================
 # TAB 1: ANÁLISE SIMPLES
@@ -350,27 +524,17 @@ with tab1:
     unidades = sorted(df['unidade'].unique())
     opcao_unidade = st.sidebar.multiselect("Selecione:", options=unidades, default=unidades, key="tab1_unidades")
     
-    # APLICAR FILTROS
-    df_filtrado = df[
-        (df['dataconsulta'].dt.date >= data_inicio) &
-        (df['dataconsulta'].dt.date <= data_fim)
-    ]
+    st.sidebar.markdown("<h3 style='font-size: 1.1rem; margin-top: 1.5rem;'>⚡ Desempenho</h3>", unsafe_allow_html=True)
+    modo_progressivo = st.sidebar.toggle(
+        "Resultados progressivos", value=False, key="tab1_progressivo",
+        help="Em períodos muito grandes, mostra estimativas por amostragem enquanto os valores exatos são calculados"
+    )
     
-    if opcao_unidade:
-        df_filtrado = df_filtrado[df_filtrado['unidade'].isin(opcao_unidade)]
+    # APLICAR FILTROS
+    unidades_filtro = tuple(sorted(opcao_unidade))
     
     # PERÍODO ANTERIOR
-    dias_diferenca = (pd.to_datetime(data_fim) - pd.to_datetime(data_inicio)).days + 1
-    data_inicio_anterior = pd.to_datetime(data_inicio) - timedelta(days=dias_diferenca)
-    data_fim_anterior = pd.to_datetime(data_inicio) - timedelta(days=1)
-    
-    df_anterior = df[
-        (df['dataconsulta'].dt.date >= data_inicio_anterior.date()) &
-        (df['dataconsulta'].dt.date <= data_fim_anterior.date())
-    ]
-    
-    if opcao_unidade:
-        df_anterior = df_anterior[df_anterior['unidade'].isin(opcao_unidade)]
+    data_inicio_anterior, data_fim_anterior = periodo_anterior(data_inicio, data_fim)
     
     # PERÍODO TEXTO
     periodo_texto = f"{data_inicio.strftime('%d/%m/%Y')} até {data_fim.strftime('%d/%m/%Y')}"
@@ -387,25 +551,93 @@ with tab1:
     # ============== MÉTRICAS ==============
     st.markdown("<h2>📊 Indicadores Principais (com Variação %)</h2>", unsafe_allow_html=True)
 
-    def _safe_mean(series):
-        m = float(series.mean()) if len(series) > 0 else 0.0
-        return 0.0 if pd.isna(m) else m
-
     def format_brl(v: float) -> str:
         try:
             return (f"R$ {v:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.'))
         except Exception:
             return f"R$ {v}"
     
-    total_consultas_atual = len(df_filtrado)
-    unidades_ativas_atual = df_filtrado['unidade'].nunique()
-    faturamento_atual = float(df_filtrado['valor'].sum())
-    retorno_medio_atual = _safe_mean(df_filtrado['retornodaconsulta'])
-    
-    total_consultas_anterior = len(df_anterior)
-    unidades_ativas_anterior = df_anterior['unidade'].nunique()
-    faturamento_anterior = float(df_anterior['valor'].sum())
-    retorno_medio_anterior = _safe_mean(df_anterior['retornodaconsulta'])
+    def renderizar_estimativa(estimativa):
+        """Cards e gráficos aproximados exibidos enquanto o cálculo exato roda"""
+        ic = estimativa['ic']
+        st.info("⏳ Estimativa por amostragem estratificada (IC 95%) — calculando valores exatos...")
+        renderizar_cards([
+            {'rotulo': 'Total de Consultas', 'valor': f"≈ {estimativa['total']:,.0f}".replace(',', '.'),
+             'nota': f"± {ic['total']:,.0f}".replace(',', '.')},
+            {'rotulo': 'Unidades Ativas', 'valor': estimativa['unidades_ativas']},
+            {'rotulo': 'Faturamento Total', 'valor': f"≈ {format_brl(estimativa['faturamento'])}",
+             'nota': f"± {format_brl(ic['faturamento'])}"},
+            {'rotulo': 'Retorno Médio', 'valor': f"≈ {estimativa['retorno_medio']:.1f}d",
+             'nota': f"± {ic['retorno_medio']:.1f}d"},
+        ])
+        
+        col_e1, col_e2 = st.columns(2, gap="large")
+        with col_e1:
+            fig_e1 = px.bar(
+                estimativa['por_unidade'].sort_values('Total', ascending=False), x='unidade', y='Total',
+                title='Consultas por Unidade (estimativa)',
+                labels={'unidade': 'Unidade', 'Total': 'Consultas'}
+            )
+            fig_e1.update_traces(marker_color='#00d4ff', marker_line_width=0)
+            fig_e1.update_layout(
+                template='plotly_dark',
+                paper_bgcolor='rgba(0,0,0,0)',
+                plot_bgcolor='rgba(15, 52, 96, 0.3)',
+                font=dict(size=12, color='#e4e6eb', family='Inter'),
+                height=350,
+                title_font_size=16,
+                title_font_color='#00d4ff',
+                margin=dict(l=50, r=20, t=60, b=50)
+            )
+            st.plotly_chart(fig_e1, config=PLOTLY_CONFIG)
+        with col_e2:
+            fig_e2 = px.bar(
+                estimativa['por_tipo'].sort_values('valor', ascending=False), x='tipoconsulta', y='valor',
+                title='Faturamento por Especialidade (estimativa)',
+                labels={'tipoconsulta': 'Especialidade', 'valor': 'Faturamento (R$)'}
+            )
+            fig_e2.update_traces(marker_color='#00ff88', marker_line_width=0)
+            fig_e2.update_layout(
+                template='plotly_dark',
+                paper_bgcolor='rgba(0,0,0,0)',
+                plot_bgcolor='rgba(15, 52, 96, 0.3)',
+                font=dict(size=12, color='#e4e6eb', family='Inter'),
+                height=350,
+                title_font_size=16,
+                title_font_color='#00d4ff',
+                margin=dict(l=50, r=20, t=60, b=50)
+            )
+            st.plotly_chart(fig_e2, config=PLOTLY_CONFIG)
+    
+    # MODO PROGRESSIVO: estimativa primeiro, substituída pelos valores exatos
+    linhas_periodo = int(
+        cubo['qtd'][fatia_dias(cubo, data_inicio, data_fim)][:, indices_unidades(cubo, opcao_unidade), :].sum()
+    )
+    # Só vale estimar se o exato ainda não está no cache e a amostra já foi montada no aquecimento
+    amostra = None
+    if (modo_progressivo and linhas_periodo >= LIMIAR_PROGRESSIVO
+            and not visao_em_cache(versao_dados, data_inicio, data_fim, unidades_filtro)):
+        amostra = estado_pronto('amostra', versao_dados)
+    if amostra is not None:
+        area_estimativa = st.empty()
+        with area_estimativa.container():
+            renderizar_estimativa(estimar_visao(amostra, data_inicio, data_fim, unidades_filtro))
+    
+    visao_atual = obter_visao(versao_dados, data_inicio, data_fim, unidades_filtro, df)
+    visao_anterior = obter_visao(versao_dados, data_inicio_anterior, data_fim_anterior, unidades_filtro, df)
+    
+    if amostra is not None:
+        area_estimativa.empty()
+    
+    total_consultas_atual = visao_atual['total']
+    unidades_ativas_atual = visao_atual['unidades_ativas']
+    faturamento_atual = visao_atual['faturamento']
+    retorno_medio_atual = visao_atual['retorno_medio']
+    
+    total_consultas_anterior = visao_anterior['total']
+    unidades_ativas_anterior = visao_anterior['unidades_ativas']
+    faturamento_anterior = visao_anterior['faturamento']
+    retorno_medio_anterior = visao_anterior['retorno_medio']
     
     var_consultas = calcular_variacao(total_consultas_atual, total_consultas_anterior)
     var_unidades = calcular_variacao(unidades_ativas_atual, unidades_ativas_anterior)
@@ -413,51 +645,12 @@ with tab1:
     var_retorno = calcular_variacao(retorno_medio_atual, retorno_medio_anterior)
     
     # CARDS METRICS
-    col1, col2, col3, col4 = st.columns(4, gap="medium")
-    
-    with col1:
-        st.markdown(f"""
-            <div class='metric-card'>
-                <div class='metric-label'>Total de Consultas</div>
-                <div class='metric-value'>{total_consultas_atual}</div>
-                <div class='metric-change metric-{"up" if var_consultas >= 0 else "down"}'>
-                    {formatar_variacao(var_consultas)}
-                </div>
-            </div>
-        """, unsafe_allow_html=True)
-    
-    with col2:
-        st.markdown(f"""
-            <div class='metric-card'>
-                <div class='metric-label'>Unidades Ativas</div>
-                <div class='metric-value'>{unidades_ativas_atual}</div>
-                <div class='metric-change metric-{"up" if var_unidades >= 0 else "down"}'>
-                    {formatar_variacao(var_unidades)}
-                </div>
-            </div>
-        """, unsafe_allow_html=True)
-    
-    with col3:
-        st.markdown(f"""
-            <div class='metric-card'>
-                <div class='metric-label'>Faturamento Total</div>
-                <div class='metric-value'>{format_brl(faturamento_atual)}</div>
-                <div class='metric-change metric-{"up" if var_faturamento >= 0 else "down"}'>
-                    {formatar_variacao(var_faturamento)}
-                </div>
-            </div>
-        """, unsafe_allow_html=True)
-    
-    with col4:
-        st.markdown(f"""
-            <div class='metric-card'>
-                <div class='metric-label'>Retorno Médio</div>
-                <div class='metric-value'>{retorno_medio_atual:.1f}d</div>
-                <div class='metric-change metric-{"up" if var_retorno >= 0 else "down"}'>
-                    {formatar_variacao(var_retorno)}
-                </div>
-            </div>
-        """, unsafe_allow_html=True)
+    renderizar_cards([
+        {'rotulo': 'Total de Consultas', 'valor': total_consultas_atual, 'variacao': var_consultas},
+        {'rotulo': 'Unidades Ativas', 'valor': unidades_ativas_atual, 'variacao': var_unidades},
+        {'rotulo': 'Faturamento Total', 'valor': format_brl(faturamento_atual), 'variacao': var_faturamento},
+        {'rotulo': 'Retorno Médio', 'valor': f"{retorno_medio_atual:.1f}d", 'variacao': var_retorno},
+    ])
     
     st.markdown("<hr>", unsafe_allow_html=True)
     
@@ -466,7 +659,7 @@ with tab1:
     col_g1, col_g2 = st.columns(2, gap="large")
     
     with col_g1:
-        consultas_unidade = df_filtrado.groupby('unidade').size().reset_index(name='Total')
+        consultas_unidade = visao_atual['por_unidade'][['unidade', 'Total']]
         consultas_unidade = consultas_unidade.sort_values('Total', ascending=False)
         
         fig1 = px.bar(
@@ -491,7 +684,7 @@ with tab1:
         st.plotly_chart(fig1, config=PLOTLY_CONFIG)
     
     with col_g2:
-        consultas_tipo = df_filtrado.groupby('tipoconsulta').size().reset_index(name='Total')
+        consultas_tipo = visao_atual['por_tipo'][['tipoconsulta', 'Total']]
         
         fig2 = px.pie(
             consultas_tipo, values='Total', names='tipoconsulta',
@@ -517,10 +710,20 @@ with tab1:
     st.markdown("<h2>📊 Série Temporal - Evolução Diária</h2>", unsafe_allow_html=True)
     col_t1, col_t2 = st.columns(2, gap="large")
     
+    serie = serie_diaria(cubo, data_inicio, data_fim, opcao_unidade)
+    
+    mostrar_previsao = st.toggle(
+        f"🔮 Mostrar previsão dos próximos {HORIZONTE_PREVISAO} dias", value=True, key="tab1_previsao",
+        help="Tendência + sazonalidade semanal por unidade e especialidade; só aparece quando o período vai até o último dia"
+    )
+    previsao = None
+    if mostrar_previsao and data_fim >= data_max_date:
+        previsao = calcular_previsao(versao_dados, cubo)
+    
+    anomalias = listar_anomalias(obter_anomalias(versao_dados, cubo), data_inicio, data_fim, opcao_unidade)
+    
     with col_t1:
-        consultas_diarias = df_filtrado.groupby(df_filtrado['dataconsulta'].dt.date).size().reset_index()
-        consultas_diarias.columns = ['Data', 'Total']
-        consultas_diarias['Data'] = pd.to_datetime(consultas_diarias['Data'])
+        consultas_diarias = serie[['Data', 'Total']]
         
         fig3 = px.line(
             consultas_diarias, x='Data', y='Total',
@@ -539,12 +742,15 @@ with tab1:
             title_font_color='#00d4ff',
             margin=dict(l=50, r=20, t=60, b=50)
         )
+        if previsao is not None:
+            adicionar_previsao(fig3, previsao_agregada(previsao, cubo, 'qtd', opcao_unidade),
+                               '#00d4ff', 'rgba(0, 212, 255, 0.15)')
+        marcar_anomalias(fig3, consultas_diarias, 'Total',
+                         anomalias.loc[anomalias['Medida'] == 'Consultas', 'Data'])
         st.plotly_chart(fig3, config=PLOTLY_CONFIG)
     
     with col_t2:
-        faturamento_diario = df_filtrado.groupby(df_filtrado['dataconsulta'].dt.date)['valor'].sum().reset_index()
-        faturamento_diario.columns = ['Data', 'Faturamento']
-        faturamento_diario['Data'] = pd.to_datetime(faturamento_diario['Data'])
+        faturamento_diario = serie[['Data', 'Faturamento']]
         
         fig4 = px.line(
             faturamento_diario, x='Data', y='Faturamento',
@@ -563,8 +769,24 @@ with tab1:
             title_font_color='#00d4ff',
             margin=dict(l=50, r=20, t=60, b=50)
         )
+        if previsao is not None:
+            adicionar_previsao(fig4, previsao_agregada(previsao, cubo, 'valor', opcao_unidade),
+                               '#ff6b6b', 'rgba(255, 107, 107, 0.15)')
+        marcar_anomalias(fig4, faturamento_diario, 'Faturamento',
+                         anomalias.loc[anomalias['Medida'] == 'Faturamento', 'Data'])
         st.plotly_chart(fig4, config=PLOTLY_CONFIG)
     
+    # ============== ALERTAS DE ANOMALIAS ==============
+    with st.expander(f"🚨 Alertas de Anomalias ({len(anomalias)})", expanded=False):
+        st.caption("Dias em que uma unidade × especialidade fugiu do padrão do mesmo dia da semana "
+                   "nas 8 semanas anteriores (z robusto mediana/MAD em escala Poisson, |z| > 3,5)")
+        if anomalias.empty:
+            st.success("✅ Nenhuma anomalia no período selecionado")
+        else:
+            tabela_anomalias = anomalias.copy()
+            tabela_anomalias['Data'] = tabela_anomalias['Data'].dt.strftime("%d/%m/%Y")
+            st.dataframe(tabela_anomalias.round(2), hide_index=True)
+    
     st.markdown("<hr>", unsafe_allow_html=True)
     
     # ============== GRÁFICOS FINANCEIROS ==============
@@ -572,7 +794,7 @@ with tab1:
     col_f1, col_f2 = st.columns(2, gap="large")
     
     with col_f1:
-        faturamento_unidade = df_filtrado.groupby('unidade')['valor'].sum().reset_index()
+        faturamento_unidade = visao_atual['por_unidade'][['unidade', 'valor']]
         faturamento_unidade = faturamento_unidade.sort_values('valor', ascending=True)
         
         fig5 = px.bar(
@@ -597,7 +819,7 @@ with tab1:
         st.plotly_chart(fig5, config=PLOTLY_CONFIG)
     
     with col_f2:
-        faturamento_tipo = df_filtrado.groupby('tipoconsulta')['valor'].sum().reset_index()
+        faturamento_tipo = visao_atual['por_tipo'][['tipoconsulta', 'valor']]
         faturamento_tipo = faturamento_tipo.sort_values('valor', ascending=False)
         
         fig6 = px.bar(
@@ -620,6 +842,125 @@ with tab1:
         )
         fig6.update_traces(marker_line_width=0)
         st.plotly_chart(fig6, config=PLOTLY_CONFIG)
+    
+    st.markdown("<hr>", unsafe_allow_html=True)
+    
+    # ============== MAPAS DE CALOR ==============
+    st.markdown("<h2>🔥 Concentração da Demanda</h2>", unsafe_allow_html=True)
+    medida_mapa = st.radio(
+        "Medida:", options=['qtd', 'valor'], horizontal=True, key="tab1_mapa_medida",
+        format_func=lambda m: 'Consultas' if m == 'qtd' else 'Faturamento (R$)'
+    )
+    rotulo_mapa = 'Consultas' if medida_mapa == 'qtd' else 'Faturamento (R$)'
+    col_m1, col_m2 = st.columns(2, gap="large")
+    
+    mapas = [
+        (col_m1, matriz_unidade_especialidade, 'Unidade × Especialidade', 'Especialidade', 'Unidade'),
+        (col_m2, matriz_dia_semana_unidade, 'Dia da Semana × Unidade', 'Unidade', 'Dia da Semana'),
+    ]
+    for col, matriz_fn, titulo, rotulo_x, rotulo_y in mapas:
+        with col:
+            matriz = matriz_fn(cubo, data_inicio, data_fim, opcao_unidade, medida=medida_mapa)
+            fig_mapa = px.imshow(
+                matriz, text_auto='.0f', aspect='auto',
+                title=f'{rotulo_mapa} por {titulo}',
+                labels={'x': rotulo_x, 'y': rotulo_y, 'color': rotulo_mapa},
+                color_continuous_scale='Blues'
+            )
+            fig_mapa.update_layout(
+                template='plotly_dark',
+                paper_bgcolor='rgba(0,0,0,0)',
+                plot_bgcolor='rgba(15, 52, 96, 0.3)',
+                font=dict(size=12, color='#e4e6eb', family='Inter'),
+                height=450,
+                title_font_size=16,
+                title_font_color='#00d4ff',
+                margin=dict(l=50, r=20, t=60, b=50)
+            )
+            st.plotly_chart(fig_mapa, config=PLOTLY_CONFIG)
+    
+    st.markdown("<hr>", unsafe_allow_html=True)
+    
+    # ============== DISTRIBUIÇÕES (ESBOÇOS DE QUANTIS) ==============
+    st.markdown("<h2>📦 Distribuição de Valores e Retornos</h2>", unsafe_allow_html=True)
+    agrupar_por = st.radio(
+        "Agrupar por:", options=['unidade', 'tipoconsulta'], horizontal=True, key="tab1_dist_grupo",
+        format_func=lambda c: 'Unidade' if c == 'unidade' else 'Especialidade'
+    )
+    st.caption("Caixa: p25–p75 · linha: mediana · bigodes: p10–p90 (quantis aproximados, erro relativo ≤ 1%)")
+    col_d1, col_d2 = st.columns(2, gap="large")
+    
+    distribuicoes = [
+        (col_d1, 'valor', 'Ticket (R$)', '#00d4ff'),
+        (col_d2, 'retornodaconsulta', 'Retorno (dias)', '#ff6b6b'),
+    ]
+    for col, coluna, rotulo, cor in distribuicoes:
+        with col:
+            q = calcular_quantis(versao_dados, data_inicio, data_fim, unidades_filtro, agrupar_por, cubo)[coluna]
+            fig_dist = go.Figure(go.Box(
+                x=q[agrupar_por], q1=q['q25'], median=q['q50'], q3=q['q75'],
+                lowerfence=q['q10'], upperfence=q['q90'],
+                marker_color=cor, name=rotulo
+            ))
+            fig_dist.update_layout(
+                template='plotly_dark',
+                paper_bgcolor='rgba(0,0,0,0)',
+                plot_bgcolor='rgba(15, 52, 96, 0.3)',
+                font=dict(size=12, color='#e4e6eb', family='Inter'),
+                height=450,
+                title=f'Distribuição de {rotulo}',
+                title_font_size=16,
+                title_font_color='#00d4ff',
+                showlegend=False,
+                margin=dict(l=50, r=20, t=60, b=50)
+            )
+            st.plotly_chart(fig_dist, config=PLOTLY_CONFIG)
+    
+    tabela_quantis = calcular_quantis_celulas(versao_dados, data_inicio, data_fim, unidades_filtro, cubo)
+    st.dataframe(tabela_quantis.round(1), hide_index=True)
+    
+    st.markdown("<hr>", unsafe_allow_html=True)
+    
+    # ============== PROJEÇÃO DE RETORNOS ==============
+    st.markdown("<h2>🔁 Projeção de Retornos - Capacidade</h2>", unsafe_allow_html=True)
+    horizonte_retornos = st.slider(
+        "Dias após o fim do período:", min_value=7, max_value=90, value=30, key="tab1_horizonte_retornos"
+    )
+    st.caption("Retornos esperados = consultas espalhadas para dataconsulta + retornodaconsulta; "
+               "agendadas = consultas já registradas para a data")
+    carga, carga_celulas = projetar_carga(
+        obter_projecao(versao_dados, df), cubo,
+        data_fim + timedelta(days=1), data_fim + timedelta(days=horizonte_retornos), opcao_unidade
+    )
+    col_r1, col_r2 = st.columns([2, 1], gap="large")
+    
+    with col_r1:
+        fig_carga = px.bar(
+            carga, x='Data', y=['Retornos', 'Agendadas'],
+            title='Carga Prevista por Dia',
+            barmode='stack',
+            color_discrete_map={'Retornos': '#ffd700', 'Agendadas': '#00d4ff'}
+        )
+        fig_carga.update_layout(
+            template='plotly_dark',
+            paper_bgcolor='rgba(0,0,0,0)',
+            plot_bgcolor='rgba(15, 52, 96, 0.3)',
+            font=dict(size=12, color='#e4e6eb', family='Inter'),
+            height=450,
+            hovermode='x unified',
+            title_font_size=16,
+            title_font_color='#00d4ff',
+            legend_title_text='',
+            margin=dict(l=50, r=20, t=60, b=50)
+        )
+        st.plotly_chart(fig_carga, config=PLOTLY_CONFIG)
+    
+    with col_r2:
+        tabela_retornos = carga_celulas.pivot(index='unidade', columns='tipoconsulta', values='Retornos').fillna(0).astype(int)
+        tabela_retornos.index.name = 'Unidade'
+        tabela_retornos.columns.name = None
+        st.markdown(f"<h3>Retornos no horizonte: {int(carga['Retornos'].sum())}</h3>", unsafe_allow_html=True)
+        st.dataframe(tabela_retornos)
 
 # ================================================================
 # TAB 2: COMPARAÇÃO PERÍODOS
@@ -648,19 +989,9 @@ with tab2:
     opcao_unidade_comp = st.sidebar.multiselect("Selecione:", options=unidades, default=unidades, key="comp_unidades")
     
     # APLICAR FILTROS
-    df_periodo_a = df[
-        (df['dataconsulta'].dt.date >= data_a_inicio) &
-        (df['dataconsulta'].dt.date <= data_a_fim)
-    ]
-    
-    df_periodo_b = df[
-        (df['dataconsulta'].dt.date >= data_b_inicio) &
-        (df['dataconsulta'].dt.date <= data_b_fim)
-    ]
-    
-    if opcao_unidade_comp:
-        df_periodo_a = df_periodo_a[df_periodo_a['unidade'].isin(opcao_unidade_comp)]
-        df_periodo_b = df_periodo_b[df_periodo_b['unidade'].isin(opcao_unidade_comp)]
+    unidades_comp = tuple(sorted(opcao_unidade_comp))
+    visao_a = obter_visao(versao_dados, data_a_inicio, data_a_fim, unidades_comp, df)
+    visao_b = obter_visao(versao_dados, data_b_inicio, data_b_fim, unidades_comp, df)
     
     periodo_a_txt = f"{data_a_inicio.strftime('%d/%m/%Y')} até {data_a_fim.strftime('%d/%m/%Y')}"
     periodo_b_txt = f"{data_b_inicio.strftime('%d/%m/%Y')} até {data_b_fim.strftime('%d/%m/%Y')}"
@@ -687,15 +1018,15 @@ with tab2:
     st.markdown("<hr>", unsafe_allow_html=True)
     
     # CALCULAR MÉTRICAS
-    total_a = len(df_periodo_a)
-    unidades_a = df_periodo_a['unidade'].nunique()
-    faturamento_a = df_periodo_a['valor'].sum()
-    retorno_a = _safe_mean(df_periodo_a['retornodaconsulta'])
+    total_a = visao_a['total']
+    unidades_a = visao_a['unidades_ativas']
+    faturamento_a = visao_a['faturamento']
+    retorno_a = visao_a['retorno_medio']
     
-    total_b = len(df_periodo_b)
-    unidades_b = df_periodo_b['unidade'].nunique()
-    faturamento_b = df_periodo_b['valor'].sum()
-    retorno_b = _safe_mean(df_periodo_b['retornodaconsulta'])
+    total_b = visao_b['total']
+    unidades_b = visao_b['unidades_ativas']
+    faturamento_b = visao_b['faturamento']
+    retorno_b = visao_b['retorno_medio']
     
     dif_consultas = calcular_variacao(total_b, total_a)
     dif_unidades = calcular_variacao(unidades_b, unidades_a)
@@ -704,95 +1035,13 @@ with tab2:
     
     st.markdown("<h2>📊 Comparação de Métricas</h2>", unsafe_allow_html=True)
     
-    col_comp1, col_comp2, col_comp3, col_comp4 = st.columns(4, gap="medium")
-    
-    with col_comp1:
-        st.markdown(f"""
-            <div class='metric-card'>
-                <div class='metric-label'>Total de Consultas</div>
-                <div style='display: flex; justify-content: space-between; align-items: center; margin: 1rem 0;'>
-                    <div style='text-align: center;'>
-                        <div style='font-size: 1.8rem; font-weight: 700; color: #00d4ff;'>{total_a}</div>
-                        <div style='font-size: 0.8rem; color: #a0a6af;'>Período A</div>
-                    </div>
-                    <div style='color: #666; font-size: 1.5rem;'>→</div>
-                    <div style='text-align: center;'>
-                        <div style='font-size: 1.8rem; font-weight: 700; color: #ff6b6b;'>{total_b}</div>
-                        <div style='font-size: 0.8rem; color: #a0a6af;'>Período B</div>
-                    </div>
-                </div>
-                <div class='metric-change metric-{"up" if dif_consultas >= 0 else "down"}'
-                     style='text-align: center;'>
-                    {formatar_variacao(dif_consultas)}
-                </div>
-            </div>
-        """, unsafe_allow_html=True)
-    
-    with col_comp2:
-        st.markdown(f"""
-            <div class='metric-card'>
-                <div class='metric-label'>Unidades Ativas</div>
-                <div style='display: flex; justify-content: space-between; align-items: center; margin: 1rem 0;'>
-                    <div style='text-align: center;'>
-                        <div style='font-size: 1.8rem; font-weight: 700; color: #00d4ff;'>{unidades_a}</div>
-                        <div style='font-size: 0.8rem; color: #a0a6af;'>Período A</div>
-                    </div>
-                    <div style='color: #666; font-size: 1.5rem;'>→</div>
-                    <div style='text-align: center;'>
-                        <div style='font-size: 1.8rem; font-weight: 700; color: #ff6b6b;'>{unidades_b}</div>
-                        <div style='font-size: 0.8rem; color: #a0a6af;'>Período B</div>
-                    </div>
-                </div>
-                <div class='metric-change metric-{"up" if dif_unidades >= 0 else "down"}'
-                     style='text-align: center;'>
-                    {formatar_variacao(dif_unidades)}
-                </div>
-            </div>
-        """, unsafe_allow_html=True)
-    
-    with col_comp3:
-        st.markdown(f"""
-            <div class='metric-card'>
-                <div class='metric-label'>Faturamento Total</div>
-                <div style='display: flex; justify-content: space-between; align-items: center; margin: 1rem 0;'>
-                    <div style='text-align: center;'>
-                        <div style='font-size: 1.5rem; font-weight: 700; color: #00d4ff;'>{format_brl(faturamento_a)}</div>
-                        <div style='font-size: 0.8rem; color: #a0a6af;'>Período A</div>
-                    </div>
-                    <div style='color: #666; font-size: 1.5rem;'>→</div>
-                    <div style='text-align: center;'>
-                        <div style='font-size: 1.5rem; font-weight: 700; color: #ff6b6b;'>{format_brl(faturamento_b)}</div>
-                        <div style='font-size: 0.8rem; color: #a0a6af;'>Período B</div>
-                    </div>
-                </div>
-                <div class='metric-change metric-{"up" if dif_faturamento >= 0 else "down"}'
-                     style='text-align: center;'>
-                    {formatar_variacao(dif_faturamento)}
-                </div>
-            </div>
-        """, unsafe_allow_html=True)
-    
-    with col_comp4:
-        st.markdown(f"""
-            <div class='metric-card'>
-                <div class='metric-label'>Retorno Médio</div>
-                <div style='display: flex; justify-content: space-between; align-items: center; margin: 1rem 0;'>
-                    <div style='text-align: center;'>
-                        <div style='font-size: 1.8rem; font-weight: 700; color: #00d4ff;'>{retorno_a:.1f}d</div>
-                        <div style='font-size: 0.8rem; color: #a0a6af;'>Período A</div>
-                    </div>
-                    <div style='color: #666; font-size: 1.5rem;'>→</div>
-                    <div style='text-align: center;'>
-                        <div style='font-size: 1.8rem; font-weight: 700; color: #ff6b6b;'>{retorno_b:.1f}d</div>
-                        <div style='font-size: 0.8rem; color: #a0a6af;'>Período B</div>
-                    </div>
-                </div>
-                <div class='metric-change metric-{"up" if dif_retorno >= 0 else "down"}'
-                     style='text-align: center;'>
-                    {formatar_variacao(dif_retorno)}
-                </div>
-            </div>
-        """, unsafe_allow_html=True)
+    renderizar_cards([
+        {'rotulo': 'Total de Consultas', 'valor_a': total_a, 'valor_b': total_b, 'variacao': dif_consultas},
+        {'rotulo': 'Unidades Ativas', 'valor_a': unidades_a, 'valor_b': unidades_b, 'variacao': dif_unidades},
+        {'rotulo': 'Faturamento Total', 'valor_a': format_brl(faturamento_a), 'valor_b': format_brl(faturamento_b),
+         'variacao': dif_faturamento, 'tamanho_fonte': '1.5rem'},
+        {'rotulo': 'Retorno Médio', 'valor_a': f"{retorno_a:.1f}d", 'valor_b': f"{retorno_b:.1f}d", 'variacao': dif_retorno},
+    ])
     
     st.markdown("<hr>", unsafe_allow_html=True)
     st.markdown("<h2>📊 Visualizações Comparativas</h2>", unsafe_allow_html=True)
@@ -800,9 +1049,9 @@ with tab2:
     col_cg1, col_cg2 = st.columns(2, gap="large")
     
     with col_cg1:
-        comp_a_unidade = df_periodo_a.groupby('unidade').size().reset_index(name='Período A')
-        comp_b_unidade = df_periodo_b.groupby('unidade').size().reset_index(name='Período B')
-        comp_unidade = comp_a_unidade.merge(comp_b_unidade, on='unidade', how='outer').fillna(0)
+        comp_a_unidade = visao_a['por_unidade'][['unidade', 'Total']].rename(columns={'Total': 'Período A'})
+        comp_b_unidade = visao_b['por_unidade'][['unidade', 'Total']].rename(columns={'Total': 'Período B'})
+        comp_unidade = comp_a_unidade.merge(comp_b_unidade, on='unidade', how='outer').fillna({'Período A': 0, 'Período B': 0})
         
         fig_comp1 = px.bar(
             comp_unidade, x='unidade', y=['Período A', 'Período B'],
@@ -824,9 +1073,9 @@ with tab2:
         st.plotly_chart(fig_comp1, config=PLOTLY_CONFIG)
     
     with col_cg2:
-        comp_a_esp = df_periodo_a.groupby('tipoconsulta')['valor'].sum().reset_index(name='Período A')
-        comp_b_esp = df_periodo_b.groupby('tipoconsulta')['valor'].sum().reset_index(name='Período B')
-        comp_esp = comp_a_esp.merge(comp_b_esp, on='tipoconsulta', how='outer').fillna(0)
+        comp_a_esp = visao_a['por_tipo'][['tipoconsulta', 'valor']].rename(columns={'valor': 'Período A'})
+        comp_b_esp = visao_b['por_tipo'][['tipoconsulta', 'valor']].rename(columns={'valor': 'Período B'})
+        comp_esp = comp_a_esp.merge(comp_b_esp, on='tipoconsulta', how='outer').fillna({'Período A': 0, 'Período B': 0})
         
         fig_comp2 = px.bar(
             comp_esp, x='tipoconsulta', y=['Período A', 'Período B'],
@@ -879,6 +1128,34 @@ with tab3:
     with col_stat4:
         st.metric("Valor Médio", format_brl(float(df['valor'].mean() if not pd.isna(df['valor'].mean()) else 0.0)), delta=None)
 
+# ================================================================
+# TAB 4: QUALIDADE DOS DADOS (ADMIN)
+# ================================================================
+with tab4:
+    st.markdown("<h2>🛡️ Qualidade dos Dados</h2>", unsafe_allow_html=True)
+    st.info("💡 Linhas que falharam na validação ficam em quarentena e não entram em nenhum indicador")
+    
+    col_q1, col_q2, col_q3 = st.columns(3, gap="medium")
+    total_lido = len(df) + len(quarentena)
+    with col_q1:
+        st.metric("Linhas Válidas", len(df), delta=None)
+    with col_q2:
+        st.metric("Em Quarentena", len(quarentena), delta=None)
+    with col_q3:
+        st.metric("Taxa de Rejeição", f"{(len(quarentena) / total_lido * 100 if total_lido else 0.0):.2f}%", delta=None)
+    
+    if quarentena.empty:
+        st.success("✅ Nenhuma linha em quarentena nesta versão dos dados")
+    else:
+        st.markdown("<hr>", unsafe_allow_html=True)
+        col_m1, col_m2 = st.columns([1, 2], gap="large")
+        with col_m1:
+            st.markdown("<h3>Linhas por Motivo</h3>", unsafe_allow_html=True)
+            st.dataframe(contar_motivos(quarentena), hide_index=True)
+        with col_m2:
+            st.markdown("<h3>Linhas em Quarentena</h3>", unsafe_allow_html=True)
+            st.dataframe(quarentena, hide_index=True, height=400)
+
 
 # ═══════════════════════════════════════════════════════════════
 # 🏥 RODAPÉ DO DASHBOARD
@@ -0,0 +1,83 @@
+"""Abre uma sessão headless em cada worker para aquecer o cache antes do primeiro usuário.
+
+O Streamlit só executa o dashboard quando uma sessão se conecta. Sem esta
+visita, o primeiro usuário de cada worker pagaria a carga dos dados e o
+aquecimento. A sessão roda a página padrão uma vez (o que também inicia a
+thread que aquece as versões seguintes em segundo plano) e é fechada.
+
+Uso:
+    python deploy/aquecer_workers.py 8501 8502 8503 8504
+"""
+import argparse
+import asyncio
+import sys
+import time
+import urllib.request
+
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from tornado.websocket import websocket_connect
+
+
+def esperar_worker(host, porta, tempo_limite):
+    """Aguarda o health check do worker responder"""
+    limite = time.monotonic() + tempo_limite
+    while True:
+        try:
+            with urllib.request.urlopen(f"http://{host}:{porta}/_stcore/health", timeout=5) as resposta:
+                if resposta.status == 200:
+                    return
+        except OSError:
+            pass
+        if time.monotonic() > limite:
+            raise TimeoutError(f"worker na porta {porta} não respondeu em {tempo_limite}s")
+        time.sleep(1)
+
+
+async def visitar(host, porta, tempo_limite):
+    """Executa a página padrão numa sessão nova e espera o script terminar"""
+    conexao = await websocket_connect(f"ws://{host}:{porta}/_stcore/stream")
+    try:
+        mensagem = BackMsg()
+        mensagem.rerun_script.query_string = ""
+        await conexao.write_message(mensagem.SerializeToString(), binary=True)
+
+        limite = time.monotonic() + tempo_limite
+        while True:
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                raise TimeoutError(f"página padrão não terminou em {tempo_limite}s")
+            bruto = await asyncio.wait_for(conexao.read_message(), restante)
+            if bruto is None:
+                raise ConnectionError("worker fechou a conexão")
+            resposta = ForwardMsg()
+            resposta.ParseFromString(bruto)
+            if resposta.WhichOneof("type") == "script_finished":
+                return
+    finally:
+        conexao.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Aquece o cache dos workers do dashboard")
+    parser.add_argument("portas", nargs="+", type=int, help="portas dos workers")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--tempo-limite", type=int, default=600,
+                        help="segundos de espera por worker (subida + página padrão)")
+    args = parser.parse_args(argv)
+
+    falhas = 0
+    for porta in args.portas:
+        inicio = time.perf_counter()
+        try:
+            esperar_worker(args.host, porta, args.tempo_limite)
+            asyncio.run(visitar(args.host, porta, args.tempo_limite))
+            print(f"[{time.strftime('%H:%M:%S')}] 🔥 worker {porta} aquecido em {time.perf_counter() - inicio:.1f}s", flush=True)
+        except Exception as e:
+            falhas += 1
+            print(f"[{time.strftime('%H:%M:%S')}] ❌ Erro ao aquecer worker {porta}: {e}", file=sys.stderr, flush=True)
+    return 1 if falhas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,43 @@
+#!/usr/bin/env bash
+# Modo multiprocesso: N workers do dashboard + publicador de snapshots.
+#
+# Todos os workers mapeiam o mesmo snapshot (somente leitura) publicado em
+# CONSULTAS_SNAPSHOT_DIR, então a memória do dataset é compartilhada entre
+# eles. Coloque o nginx (deploy/nginx.conf) na frente das portas abertas aqui.
+#
+# Uso: deploy/iniciar_workers.sh [N_WORKERS] [PORTA_INICIAL]
+set -euo pipefail
+
+cd "$(dirname "$0")/.."
+
+N_WORKERS="${1:-${CONSULTAS_WORKERS:-4}}"
+PORTA_INICIAL="${2:-8501}"
+export CONSULTAS_SNAPSHOT_DIR="${CONSULTAS_SNAPSHOT_DIR:-/tmp/consultas-snapshot}"
+
+# Com CONSULTAS_ARQUIVO a fonte é o arquivo local, verificado por stat a cada poucos segundos
+FONTE=()
+if [ -n "${CONSULTAS_ARQUIVO:-}" ]; then
+    FONTE=(--arquivo "$CONSULTAS_ARQUIVO")
+    INTERVALO="${CONSULTAS_INTERVALO_PUBLICACAO:-5}"
+else
+    INTERVALO="${CONSULTAS_INTERVALO_PUBLICACAO:-300}"
+fi
+
+# Primeira publicação antes de subir os workers, para não abrirem sem dados
+python publicar_dados.py "$CONSULTAS_SNAPSHOT_DIR" "${FONTE[@]}"
+python publicar_dados.py "$CONSULTAS_SNAPSHOT_DIR" "${FONTE[@]}" --intervalo "$INTERVALO" &
+
+for i in $(seq 0 $((N_WORKERS - 1))); do
+    CONSULTAS_ARQUIVO= streamlit run dashboard.py \
+        --server.port $((PORTA_INICIAL + i)) \
+        --server.headless true \
+        --logger.level=error \
+        --client.showErrorDetails=false &
+done
+
+# Uma visita headless por worker: carrega os dados e aquece o cache antes do
+# primeiro usuário; as versões seguintes são aquecidas pela thread de cada worker
+python deploy/aquecer_workers.py $(seq "$PORTA_INICIAL" $((PORTA_INICIAL + N_WORKERS - 1))) &
+
+trap 'kill $(jobs -p) 2>/dev/null' EXIT INT TERM
+wait
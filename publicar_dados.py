@@ -0,0 +1,69 @@
+"""Publica o dataset de consultas como snapshot mapeável em memória.
+
+Usado no modo multiprocesso: um único publicador lê os dados (jsDelivr ou
+arquivo local), monta o cubo de pré-agregados e grava tudo em
+CONSULTAS_SNAPSHOT_DIR. Cada worker do dashboard (iniciado com a mesma
+variável) apenas mapeia os arquivos em modo somente leitura, então
+adicionar workers não multiplica o uso de RAM.
+
+Uso:
+    python publicar_dados.py /srv/consultas/snapshot
+    python publicar_dados.py /srv/consultas/snapshot --intervalo 300
+    python publicar_dados.py /srv/consultas/snapshot --arquivo /mnt/export/consultas.csv --intervalo 5
+"""
+import argparse
+import sys
+import time
+
+from dados import (
+    assinatura_arquivo, baixar_csv, ler_arquivo_consultas, ler_consultas, publicar_snapshot,
+    versao_do_arquivo, versao_do_conteudo, versao_do_snapshot, versao_publicada,
+)
+
+
+def publicar_uma_vez(raiz, arquivo=None):
+    """Lê a fonte e publica uma nova versão se o conteúdo mudou"""
+    if arquivo:
+        versao = versao_do_snapshot(versao_do_arquivo(arquivo))
+        if versao == versao_publicada(raiz):
+            return versao, False
+        df, quarentena = ler_arquivo_consultas(arquivo)
+    else:
+        texto = baixar_csv()
+        versao = versao_do_snapshot(versao_do_conteudo(texto))
+        if versao == versao_publicada(raiz):
+            return versao, False
+        df, quarentena = ler_consultas(texto)
+    publicar_snapshot(df, raiz, versao, quarentena)
+    return versao, True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Publica o snapshot compartilhado do dashboard")
+    parser.add_argument("raiz", help="pasta de snapshots (a mesma de CONSULTAS_SNAPSHOT_DIR)")
+    parser.add_argument("--arquivo", help="arquivo local (.csv, .parquet, .arrow) em vez do jsDelivr")
+    parser.add_argument("--intervalo", type=int, default=0,
+                        help="segundos entre verificações; 0 publica uma vez e sai")
+    args = parser.parse_args(argv)
+
+    assinatura_anterior = None
+    while True:
+        try:
+            # Com arquivo local, um stat basta para saber se vale reler
+            assinatura = assinatura_arquivo(args.arquivo) if args.arquivo else None
+            if assinatura is None or assinatura != assinatura_anterior:
+                versao, publicada = publicar_uma_vez(args.raiz, args.arquivo)
+                estado = "publicada" if publicada else "sem mudanças"
+                print(f"[{time.strftime('%H:%M:%S')}] versão {versao}: {estado}", flush=True)
+                assinatura_anterior = assinatura
+        except Exception as e:
+            print(f"[{time.strftime('%H:%M:%S')}] ❌ Erro ao publicar: {e}", file=sys.stderr, flush=True)
+            if not args.intervalo:
+                return 1
+        if not args.intervalo:
+            return 0
+        time.sleep(args.intervalo)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+
+from dados import FRACAO_AMOSTRA, MINIMO_ESTRATO, atualizar_amostra
+
+
+def _consultas(n=20000, semente=0):
+    rng = np.random.default_rng(semente)
+    return pd.DataFrame({
+        'dataconsulta': pd.Timestamp('2025-01-01') + pd.to_timedelta(rng.integers(0, 120, n), unit='D'),
+        'unidade': rng.choice(['bairro', 'centro', 'interior'], n, p=[0.6, 0.35, 0.05]),
+        'tipoconsulta': rng.choice(['cardio', 'endocrino', 'pediatra'], n),
+        'valor': rng.uniform(80, 300, n),
+        'retornodaconsulta': rng.integers(1, 60, n).astype(float),
+    })
+
+
+def _tamanhos(df, estratos):
+    rotulos = df['unidade'] + ' | ' + df['tipoconsulta']
+    return rotulos.value_counts().reindex(estratos).to_numpy()
+
+
+def test_amostra_incremental_mantem_tamanho_dos_estratos():
+    df = _consultas()
+    estado = None
+    for k in (2000, 9000, 15000, len(df)):
+        estado = atualizar_amostra(df[:k], estado)
+        np.testing.assert_array_equal(estado['N'], _tamanhos(df[:k], estado['estratos']))
+        assert estado['n'] == k
+
+    # Só ficam na amostra as linhas abaixo do limiar atual do seu estrato
+    limiar = np.maximum(FRACAO_AMOSTRA, MINIMO_ESTRATO / estado['N'])
+    linhas = estado['linhas']
+    assert (linhas['u'].to_numpy() < limiar[linhas['estrato'].to_numpy()]).all()
+    assert not linhas.index.duplicated().any()
+
+
+def test_amostra_refeita_se_o_dataset_mudou():
+    df = _consultas()
+    anterior = atualizar_amostra(df[:10000])
+    estado = atualizar_amostra(df.iloc[::-1].reset_index(drop=True), anterior)
+    np.testing.assert_array_equal(estado['N'], _tamanhos(df, estado['estratos']))
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+
+from dados import LIMIAR_ANOMALIA, atualizar_anomalias, construir_cubo
+
+
+def _consultas(dias=120, semente=0):
+    rng = np.random.default_rng(semente)
+    datas = pd.Timestamp('2025-01-01') + pd.to_timedelta(rng.integers(0, dias, 3000), unit='D')
+    return pd.DataFrame({
+        'dataconsulta': datas,
+        'unidade': rng.choice(['bairro', 'centro'], 3000),
+        'tipoconsulta': rng.choice(['clinico', 'pediatria'], 3000),
+        'valor': rng.uniform(80, 300, 3000),
+        'retornodaconsulta': rng.integers(7, 60, 3000).astype(float),
+    })
+
+
+def _comparar(estado, completo):
+    for m in ('qtd', 'valor'):
+        np.testing.assert_array_equal(estado[f'z_{m}'], completo[f'z_{m}'])
+        np.testing.assert_array_equal(estado[f'esperado_{m}'], completo[f'esperado_{m}'])
+
+
+def test_mesmo_cubo_duas_vezes():
+    df = _consultas()
+    anterior = atualizar_anomalias(construir_cubo(df))
+    # Só o retorno muda: qtd/valor do cubo ficam idênticos
+    df.loc[0, 'retornodaconsulta'] += 1
+    cubo = construir_cubo(df)
+    estado = atualizar_anomalias(cubo, anterior)
+    assert estado['recalculados'] == 0
+    _comparar(estado, atualizar_anomalias(cubo))
+
+
+def test_cubo_mais_curto():
+    df = _consultas()
+    anterior = atualizar_anomalias(construir_cubo(df))
+    truncado = df[df['dataconsulta'] < df['dataconsulta'].max().normalize()]
+    cubo = construir_cubo(truncado)
+    estado = atualizar_anomalias(cubo, anterior)
+    assert estado['z_qtd'].shape == cubo['qtd'].reshape(cubo['qtd'].shape[0], -1).shape
+    _comparar(estado, atualizar_anomalias(cubo))
+
+
+def test_poucos_alarmes_em_serie_estacionaria():
+    # 2 anos de contagens Poisson estáveis em 12 séries, tickets lognormais
+    rng = np.random.default_rng(1)
+    dias, lam = np.meshgrid(np.arange(730), rng.uniform(0.3, 25, 12), indexing='ij')
+    n = rng.poisson(lam)
+    dia = np.repeat(dias.ravel(), n.ravel())
+    serie = np.repeat(np.tile(np.arange(12), 730), n.ravel())
+    df = pd.DataFrame({
+        'dataconsulta': pd.Timestamp('2023-01-02') + pd.to_timedelta(dia, unit='D'),
+        'unidade': np.array(['bairro', 'centro', 'interior'])[serie // 4],
+        'tipoconsulta': np.array(['cardio', 'endocrino', 'pediatra', 'urologista'])[serie % 4],
+        'valor': rng.lognormal(np.log(200), 0.4, len(dia)),
+        'retornodaconsulta': np.nan,
+    })
+    estado = atualizar_anomalias(construir_cubo(df))
+    for m in ('qtd', 'valor'):
+        z = estado[f'z_{m}'][~np.isnan(estado[f'z_{m}'])]
+        assert (np.abs(z) > LIMIAR_ANOMALIA).mean() < 0.005
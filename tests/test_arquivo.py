@@ -0,0 +1,35 @@
+import pandas as pd
+import pytest
+
+from dados import ler_arquivo_consultas
+
+pytest.importorskip('pyarrow')
+
+REGISTROS = pd.DataFrame({
+    'dataconsulta': ['2025-10-06', '2025-10-06', '2025-10-07'],
+    'unidade': ['centro', 'bairro', 'norte'],
+    'tipoconsulta': ['cardio', 'cardio', 'cardio'],
+    'valor': ['320', '-5', '100'],
+    'retornodaconsulta': ['5', '3', ''],
+})
+
+
+def test_linha_no_csv_conta_o_cabecalho(tmp_path):
+    caminho = tmp_path / 'consultas.csv'
+    REGISTROS.to_csv(caminho, index=False)
+    _, quarentena = ler_arquivo_consultas(str(caminho))
+    assert quarentena['linha'].tolist() == [3, 4]
+
+
+@pytest.mark.parametrize('extensao', ['.parquet', '.arrow'])
+def test_linha_em_parquet_e_arrow_e_o_numero_do_registro(tmp_path, extensao):
+    caminho = tmp_path / f'consultas{extensao}'
+    # Índice fora de ordem: a linha deve seguir a posição no arquivo
+    registros = REGISTROS.set_index(pd.Index([10, 20, 30]))
+    if extensao == '.parquet':
+        registros.to_parquet(caminho)
+    else:
+        registros.reset_index(drop=True).to_feather(caminho)
+    df, quarentena = ler_arquivo_consultas(str(caminho))
+    assert len(df) == 1
+    assert quarentena['linha'].tolist() == [2, 3]
@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+
+from dados import ERRO_RELATIVO_ESBOCO, construir_cubo, quantis_esboco
+
+QUANTIS = (0.1, 0.25, 0.5, 0.75, 0.9)
+
+
+def _consultas(n=20000, semente=0):
+    rng = np.random.default_rng(semente)
+    return pd.DataFrame({
+        'dataconsulta': pd.Timestamp('2025-01-01') + pd.to_timedelta(rng.integers(0, 90, n), unit='D'),
+        'unidade': rng.choice(['bairro', 'centro', 'interior'], n),
+        'tipoconsulta': rng.choice(['cardio', 'endocrino', 'pediatra'], n),
+        'valor': rng.lognormal(np.log(200), 0.6, n),
+        'retornodaconsulta': np.where(rng.random(n) < 0.1, 0.0, rng.integers(1, 90, n)),
+    })
+
+
+def test_quantis_dentro_do_erro_relativo():
+    df = _consultas()
+    cubo = construir_cubo(df)
+    inicio, fim = pd.Timestamp('2025-01-15'), pd.Timestamp('2025-02-20')
+    periodo = df[df['dataconsulta'].between(inicio, fim)]
+
+    for coluna in ('valor', 'retornodaconsulta'):
+        for por in ('unidade', 'tipoconsulta'):
+            q = quantis_esboco(cubo['esbocos'][coluna], inicio, fim, cubo, ['bairro', 'centro'], por=por)
+            filtrado = periodo[periodo['unidade'].isin(['bairro', 'centro'])]
+            for _, linha in q.iterrows():
+                x = filtrado.loc[filtrado[por] == linha[por], coluna].to_numpy()
+                assert linha['n'] == len(x)
+                exatos = np.quantile(x, QUANTIS, method='lower')
+                aproximados = linha[[f'q{round(p * 100)}' for p in QUANTIS]].to_numpy(dtype=float)
+                np.testing.assert_allclose(aproximados, exatos, rtol=ERRO_RELATIVO_ESBOCO + 1e-9, atol=0)
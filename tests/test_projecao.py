@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+
+from dados import atualizar_projecao_retornos
+
+
+def _consultas(n=5000, semente=0):
+    rng = np.random.default_rng(semente)
+    df = pd.DataFrame({
+        'dataconsulta': pd.Timestamp('2025-01-01') + pd.to_timedelta(rng.integers(0, 120, n), unit='D'),
+        'unidade': rng.choice(['bairro', 'centro', 'interior'], n),
+        'tipoconsulta': rng.choice(['cardio', 'endocrino', 'pediatra'], n),
+        'valor': rng.uniform(80, 300, n),
+        'retornodaconsulta': np.where(rng.random(n) < 0.2, np.nan, rng.integers(0, 60, n)),
+    })
+    return df.sort_values('dataconsulta', kind='stable').reset_index(drop=True)
+
+
+def test_projecao_incremental_igual_a_completa():
+    df = _consultas()
+    k = 3500
+    completa = atualizar_projecao_retornos(df)
+    incremental = atualizar_projecao_retornos(df, atualizar_projecao_retornos(df[:k]))
+
+    assert incremental['linhas_processadas'] == len(df) - k
+    assert completa['linhas_processadas'] == len(df)
+    np.testing.assert_array_equal(incremental['retornos'], completa['retornos'])
+    assert incremental['retornos'].sum() == df['retornodaconsulta'].notna().sum()
+
+
+def test_projecao_refeita_se_o_inicio_mudou():
+    df = _consultas()
+    anterior = atualizar_projecao_retornos(df[:3500])
+    alterado = df.copy()
+    alterado.loc[0, 'retornodaconsulta'] = 7
+    estado = atualizar_projecao_retornos(alterado, anterior)
+
+    assert estado['linhas_processadas'] == len(alterado)
+    np.testing.assert_array_equal(estado['retornos'], atualizar_projecao_retornos(alterado)['retornos'])
@@ -0,0 +1,62 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from dados import (
+    abrir_snapshot, construir_cubo, ler_consultas, publicar_snapshot, versao_do_conteudo,
+    versao_do_snapshot, versao_publicada,
+)
+
+CSV = '\n'.join([
+    'dataconsulta,unidade,tipoconsulta,valor,retornodaconsulta',
+    '2025-10-06,centro,cardio,320,5',
+    '2025-10-06,bairro,endocrino,270,',
+    '2025-10-07,interior,pediatra,-10,3',
+    '2025-10-09,centro,urologista,180,10',
+])
+
+
+def _publicar(raiz):
+    df, quarentena = ler_consultas(CSV)
+    versao = versao_do_snapshot(versao_do_conteudo(CSV))
+    publicar_snapshot(df, str(raiz), versao, quarentena)
+    return df, quarentena, versao
+
+
+def test_publicar_e_abrir_snapshot(tmp_path):
+    df, quarentena, versao = _publicar(tmp_path)
+    assert versao_publicada(str(tmp_path)) == versao
+
+    df_snap, cubo_snap, quarentena_snap = abrir_snapshot(str(tmp_path), versao)
+    pd.testing.assert_frame_equal(
+        df_snap.astype({'unidade': str, 'tipoconsulta': str}), df.reset_index(drop=True),
+        check_dtype=False,
+    )
+
+    cubo = construir_cubo(df)
+    assert cubo_snap['dia0'] == cubo['dia0']
+    assert list(cubo_snap['unidades']) == cubo['unidades']
+    assert list(cubo_snap['tipos']) == cubo['tipos']
+    for nome in ('qtd', 'valor', 'retorno_soma', 'retorno_qtd'):
+        np.testing.assert_array_equal(cubo_snap[nome], cubo[nome])
+    for coluna, esboco in cubo['esbocos'].items():
+        np.testing.assert_array_equal(cubo_snap['esbocos'][coluna]['contagens'], esboco['contagens'])
+
+    assert quarentena_snap['linha'].tolist() == quarentena['linha'].astype(str).tolist()
+    assert quarentena_snap['motivo'].tolist() == quarentena['motivo'].tolist()
+
+
+def test_snapshot_de_formato_antigo(tmp_path):
+    _, _, versao = _publicar(tmp_path)
+    caminho = os.path.join(tmp_path, versao, 'meta.json')
+    with open(caminho, encoding='utf-8') as f:
+        meta = json.load(f)
+    del meta['formato']
+    with open(caminho, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+
+    with pytest.raises(ValueError, match='formato'):
+        abrir_snapshot(str(tmp_path), versao)
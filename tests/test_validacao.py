@@ -0,0 +1,69 @@
+import importlib
+
+import pytest
+
+import dados
+from dados import ler_consultas
+
+CABECALHO = 'dataconsulta,unidade,tipoconsulta,valor,retornodaconsulta'
+
+
+def test_data_fora_do_padrao_na_primeira_linha():
+    linhas = [
+        '06/10/2025,centro,cardio,320,5',
+        '2025-10-06,bairro,cardio,270,3',
+        '2025-10-07 08:00,centro,endocrino,250,',
+        '2025-10-08,interior,pediatra,180,10',
+    ]
+    df, quarentena = ler_consultas('\n'.join([CABECALHO, *linhas]))
+    assert len(df) == 3
+    assert quarentena['linha'].tolist() == [2]
+
+
+def test_motivos_e_linhas_da_quarentena():
+    linhas = [
+        '2025-10-06,centro,cardio,320,5',         # linha 2: válida
+        '2025-10-06,centro,cardio,-5,5',          # linha 3
+        '2025-10-06,norte,cardio,100,5',          # linha 4
+        '2025-10-06,centro,cardio,100,abc',       # linha 5
+        '2025-10-06,centro,cardio,100,400',       # linha 6
+        'ontem,norte,cardio,-1,-3',               # linha 7: vários motivos
+        '2025-10-07, Bairro ,CARDIO,150,',        # linha 8: válida após normalizar
+    ]
+    df, quarentena = ler_consultas('\n'.join([CABECALHO, *linhas]))
+
+    assert df['unidade'].tolist() == ['centro', 'bairro']
+    assert df['tipoconsulta'].tolist() == ['cardio', 'cardio']
+    assert quarentena['linha'].tolist() == [3, 4, 5, 6, 7]
+    assert quarentena['motivo'].tolist() == [
+        'VALOR_NEGATIVO',
+        'UNIDADE_DESCONHECIDA',
+        'RETORNO_INVALIDO',
+        'RETORNO_FORA_DA_FAIXA',
+        'DATA_INVALIDA;UNIDADE_DESCONHECIDA;VALOR_NEGATIVO;RETORNO_FORA_DA_FAIXA',
+    ]
+    # A quarentena guarda os valores originais do CSV
+    assert quarentena.loc[quarentena['linha'] == 7, 'dataconsulta'].item() == 'ontem'
+
+
+def test_colunas_obrigatorias_ausentes():
+    with pytest.raises(ValueError, match='valor, retornodaconsulta'):
+        ler_consultas('dataconsulta,unidade,tipoconsulta\n2025-10-06,centro,cardio')
+
+
+def test_vocabulario_do_ambiente_normalizado(monkeypatch):
+    monkeypatch.setenv('CONSULTAS_UNIDADES', 'Centro, Bairro ,')
+    try:
+        importlib.reload(dados)
+        assert dados.UNIDADES_CONHECIDAS == ['centro', 'bairro']
+        df, quarentena = dados.ler_consultas('\n'.join([
+            CABECALHO,
+            '2025-10-06,centro,cardio,320,5',
+            '2025-10-06, Bairro ,cardio,270,3',
+            '2025-10-06,interior,cardio,270,3',
+        ]))
+        assert df['unidade'].tolist() == ['centro', 'bairro']
+        assert quarentena['motivo'].tolist() == ['UNIDADE_DESCONHECIDA']
+    finally:
+        monkeypatch.undo()
+        importlib.reload(dados)